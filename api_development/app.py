@@ -1,15 +1,25 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Literal
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from pydantic import BaseModel, Field
+from typing import Literal, List
 import pandas as pd
-import joblib
 from prophet import Prophet
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 import os
 import logging
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from forecasting import (model_cache, forecast_cache, cached_forecast, run_forecast, run_forecast_group,
+                         model_digest)
+from serialization import negotiate_format, render_forecast, batch_entry, dumps, JSON, NDJSON
+from metrics import REQUESTS, REQUEST_LATENCY, observe_stages, register_runtime_collector
 # CONFIG
 DB_HOST = os.environ.get('POSTGRES_HOST', 'localhost')
 DB_PORT = "5432"
@@ -17,41 +27,218 @@ DB_NAME = os.environ.get('POSTGRES_DB', 'your_database')
 DB_USER = os.environ.get('POSTGRES_USER', 'your_user')
 DB_PASS  = os.environ.get('POSTGRES_PASSWORD', 'your_password')
 TABLE_NAME = "online_retail_data"
+# Daily sales per country, maintained by the loader and the Kafka consumer
+ROLLUP_TABLE = "daily_sales_by_country"
+FORECAST_TABLE = "forecast_results"
 
 # ASYNC DB setup
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 engine = create_async_engine(DATABASE_URL, echo=False)
 MODEL_DIR = f"../models"
+# Inference runs off the event loop: "thread" or "process" pool, WORKERS at a time,
+# at most QUEUE_SIZE more waiting before requests are turned away with 503
+INFERENCE_EXECUTOR = os.environ.get('INFERENCE_EXECUTOR', 'thread')
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', '2'))
+INFERENCE_QUEUE_SIZE = int(os.environ.get('INFERENCE_QUEUE_SIZE', '8'))
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '200'))
+# Longest horizon a single forecast may ask for (ten years of daily periods)
+MAX_PERIODS = int(os.environ.get('MAX_PERIODS', '3660'))
+# Frequencies forecast once per model at startup so the first real request is warm
+WARMUP_FREQS = ("D", "M", "Y")
+ENGINES = ("prophet", "fourier")
+# Precomputed-forecast lookups give up after this many seconds and run inference instead;
+# after a failure the table isn't asked again for PRECOMPUTED_BACKOFF seconds
+PRECOMPUTED_TIMEOUT = float(os.environ.get('PRECOMPUTED_TIMEOUT', '0.5'))
+PRECOMPUTED_BACKOFF = float(os.environ.get('PRECOMPUTED_BACKOFF', '30'))
 AsyncSessionLocal = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 # FASTAPI
 app = FastAPI()
 
+
+# INFERENCE POOL
+class InferencePool:
+    """
+    Runs blocking model work in an executor so the event loop (and /health) stays responsive.
+    Admission is bounded: once `workers + queue_size` calls are in flight, new ones fail fast.
+    """
+
+    def __init__(self, kind: str, workers: int, queue_size: int):
+        if kind == "process":
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self.kind = kind
+        self.workers = workers
+        self.limit = workers + queue_size
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        if self.in_flight >= self.limit:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Inference queue is full, retry later.",
+                                headers={"Retry-After": "1"})
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(fn, *args))
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.workers),
+            "rejected": self.rejected,
+        }
+
+
+inference_pool = InferencePool(INFERENCE_EXECUTOR, INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE)
+register_runtime_collector(engine, inference_pool, {"model": model_cache, "forecast": forecast_cache})
+
+
+async def run_inference(stages: dict, fn, *args):
+    """Run `fn` in the inference pool; time spent waiting for a worker is recorded as pool_wait."""
+    start = time.perf_counter()
+    result, worker_stages = await inference_pool.run(fn, *args)
+    stages.update(worker_stages)
+    stages['pool_wait'] = max(0.0, time.perf_counter() - start - sum(worker_stages.values()))
+    return result
+
+
+@app.on_event("shutdown")
+def shutdown_inference_pool():
+    inference_pool.executor.shutdown(wait=False, cancel_futures=True)
+
 # INPUT SCHEMA
 class ForecastRequest(BaseModel):
     country: str
     freq: Literal["D", "M", "Y"] = "D"
-    periods: int = 30
+    periods: int = Field(30, ge=1, le=MAX_PERIODS)
+    # Prophet's uncertainty simulation is only run when intervals are asked for
+    include_intervals: bool = False
+    # "fourier" is the lightweight batched engine; it has no intervals
+    engine: Literal["prophet", "fourier"] = "prophet"
+
+class BatchForecastRequest(BaseModel):
+    items: List[ForecastRequest]
+
+def model_path_for(country: str, include_intervals: bool = False, engine: str = "prophet") -> str:
+    """
+    The compact parameter artifact when there is one, the pickle otherwise.
+    Intervals need Prophet's own predict, so they always use the pickle.
+    """
+    stem = os.path.join(MODEL_DIR, f"{engine}_model_{country.replace(' ', '_')}")
+    if not include_intervals and os.path.exists(f"{stem}.json"):
+        return f"{stem}.json"
+    return f"{stem}.pkl"
 
 # HELPER: Fetch data from Postgres
+PERIOD_UNITS = {"D": "day", "M": "month", "Y": "year"}
+PERIOD_STARTS = {"D": "D", "M": "MS", "Y": "YS"}
+
 async def fetch_data(session: AsyncSession, country: str, freq: str) -> pd.DataFrame:
-    query = text('''
-    SELECT "InvoiceDate", "Quantity", "UnitPrice"
-    FROM online_retail_data
-    WHERE "Quantity" > 0 AND "UnitPrice" > 0 AND "Country" = :country
-    ''')
-    result = await session.execute(query, {"country": country})
-    rows = result.fetchall()
-    df = pd.DataFrame(rows, columns=["InvoiceDate", "Quantity", "UnitPrice"])
+    """
+    Sales per period for one country, read from the daily rollup (one row per period on the wire).
+    Falls back to aggregating the raw line items when the rollup is missing or has no rows for the country.
+    """
+    params = {"unit": PERIOD_UNITS[freq], "country": country}
+    rows = []
+    try:
+        result = await session.execute(text(f'''
+        SELECT date_trunc(:unit, day::timestamp) AS ds, SUM(sales)::float8 AS y
+        FROM {ROLLUP_TABLE}
+        WHERE country = :country
+        GROUP BY 1
+        ORDER BY 1
+        '''), params)
+        rows = result.fetchall()
+    except DBAPIError:
+        await session.rollback()
+    if not rows:
+        result = await session.execute(text(f'''
+        SELECT date_trunc(:unit, "InvoiceDate") AS ds, SUM("Quantity" * "UnitPrice")::float8 AS y
+        FROM {TABLE_NAME}
+        WHERE "Quantity" > 0 AND "UnitPrice" > 0 AND "Country" = :country
+        GROUP BY 1
+        ORDER BY 1
+        '''), params)
+        rows = result.fetchall()
+    df = pd.DataFrame(rows, columns=["ds", "y"])
 
     if df.empty:
         raise ValueError("No data found for this country.")
 
-    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
-    df['SaleAmount'] = df['Quantity'] * df['UnitPrice']
-    grouped = df.groupby(pd.Grouper(key="InvoiceDate", freq=freq))['SaleAmount'].sum().reset_index()
-    grouped.columns = ['ds', 'y']
-    return grouped.dropna()
+    # Periods without sales count as zero, as they did with pd.Grouper
+    df['ds'] = pd.to_datetime(df['ds'])
+    periods = pd.date_range(df['ds'].min(), df['ds'].max(), freq=PERIOD_STARTS[freq])
+    return df.set_index('ds').reindex(periods, fill_value=0.0).rename_axis('ds').reset_index()
+
+# HELPER: Precomputed forecasts written by the trainer
+async def fetch_precomputed(session: AsyncSession, country: str, freq: str, periods: int, model_version: str):
+    """Forecast rows materialized for this exact model file, or None if they don't cover the request."""
+    query = text(f'''
+    SELECT ds, yhat
+    FROM {FORECAST_TABLE}
+    WHERE country = :country AND freq = :freq AND step <= :periods AND model_version = :version
+    ORDER BY step
+    ''')
+    result = await session.execute(
+        query, {"country": country, "freq": freq, "periods": periods, "version": model_version})
+    rows = result.fetchall()
+    if len(rows) < periods:
+        return None
+    return pd.DataFrame(rows, columns=['Date', 'Predicted Sales'])
+
+# WARM-UP
+warmup_state = {"ready": False, "models": 0, "failed": 0, "seconds": None}
+
+def discover_models() -> list:
+    """(engine, country) pairs with a model (pickle or parameter artifact) under MODEL_DIR."""
+    if not os.path.isdir(MODEL_DIR):
+        return []
+    models = set()
+    for name in os.listdir(MODEL_DIR):
+        engine, sep, rest = name.partition("_model_")
+        if sep and engine in ENGINES and name.endswith((".pkl", ".json")):
+            models.add((engine, rest.split(".")[0].replace("_", " ")))
+    return sorted(models)
+
+async def warm_up():
+    """
+    Load every model and run one forecast per frequency through the inference pool,
+    so model loads and first-call costs are paid before the pod takes traffic.
+    """
+    start = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.execute(text("SELECT 1"))
+    except Exception as e:
+        logging.warning("⚠️ Could not open a database connection during warm-up: %s", e)
+
+    for engine, country in discover_models():
+        model_path = model_path_for(country, engine=engine)
+        try:
+            await asyncio.to_thread(model_digest, model_path)
+            for freq in WARMUP_FREQS:
+                await run_inference({}, run_forecast, model_path, freq, 1)
+            warmup_state["models"] += 1
+        except Exception:
+            logging.exception(f"❌ Warm-up failed for {model_path}")
+            warmup_state["failed"] += 1
+
+    warmup_state["seconds"] = round(time.perf_counter() - start, 3)
+    warmup_state["ready"] = True
+    logging.info("✅ Warm-up done: %s", warmup_state)
+
+@app.on_event("startup")
+async def start_warm_up():
+    # Runs in the background so /health answers the liveness probe meanwhile
+    app.state.warmup_task = asyncio.ensure_future(warm_up())
 
 @app.get("/health")
 async def health_check():
@@ -62,26 +249,217 @@ async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness endpoint for Kubernetes.
+    Returns 200 once startup warm-up has finished, 503 before that.
+    """
+    if not warmup_state["ready"]:
+        return Response(content=dumps({"status": "warming up", **warmup_state}),
+                        status_code=503, media_type=JSON)
+    return {"status": "ready", **warmup_state}
+
+
+@app.get("/cache")
+async def cache_stats():
+    """
+    Hit/miss/eviction counters of the in-process model and forecast caches,
+    plus inference pool occupancy. With a process pool the caches live in the
+    worker processes and are not reflected here.
+    """
+    return {"models": model_cache.stats(), "forecasts": forecast_cache.stats(), "inference": inference_pool.stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-stage latency histograms, request counts by
+    country/freq/status, DB and inference pool gauges, cache counters.
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/history")
+async def history(country: str, freq: Literal["D", "M", "Y"] = "D"):
+    """
+    Actual sales per period for a country, e.g. to plot next to a forecast.
+    """
+    start = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as session:
+            df = await fetch_data(session, country=country, freq=freq)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logging.exception("❌ Exception while fetching history")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        observe_stages({"db_history": time.perf_counter() - start})
+
+    df.rename(columns={'ds': 'Date', 'y': 'Sales'}, inplace=True)
+    return df.to_dict(orient='records')
+
+
 # ROUTE
 @app.post("/predict")
-async def predict(req: ForecastRequest):
-    model_path = os.path.join(MODEL_DIR, f"prophet_model_{req.country.replace(' ', '_')}.pkl")
+async def predict(req: ForecastRequest, request: Request):
+    """
+    Forecast for one country. The response format follows the Accept header or ?format=:
+    records JSON (default), columnar JSON, or Arrow IPC stream.
+    """
+    start = time.perf_counter()
+    model_path = model_path_for(req.country, req.include_intervals, req.engine)
+    # Only known countries become label values, so arbitrary input can't blow up cardinality
+    country = req.country if os.path.exists(model_path) else "unknown"
+    stages = {}
+    status = 500
+    try:
+        response = await forecast_response(req, request, model_path, stages)
+        status = response.status_code
+        return response
+    except HTTPException as e:
+        status = e.status_code
+        raise
+    finally:
+        observe_stages(stages)
+        REQUESTS.labels("predict", country, req.freq, str(status)).inc()
+        REQUEST_LATENCY.labels("predict").observe(time.perf_counter() - start)
+
+
+precomputed_state = {"skip_until": 0.0}
 
+async def lookup_precomputed(req: ForecastRequest, model_path: str, stages: dict):
+    """
+    Precomputed rows for this request, or None. Bounded by PRECOMPUTED_TIMEOUT so an
+    unreachable database costs one short wait, then none for PRECOMPUTED_BACKOFF seconds.
+    """
+    if time.monotonic() < precomputed_state["skip_until"]:
+        return None
+    start = time.perf_counter()
+    try:
+        # Hashing a pickle the first time it is seen is disk and CPU work: keep it off the loop
+        version = await asyncio.to_thread(model_digest, model_path)
+
+        async def fetch():
+            async with AsyncSessionLocal() as session:
+                return await fetch_precomputed(session, req.country, req.freq, req.periods, version)
+
+        return await asyncio.wait_for(fetch(), timeout=PRECOMPUTED_TIMEOUT)
+    except Exception as e:
+        precomputed_state["skip_until"] = time.monotonic() + PRECOMPUTED_BACKOFF
+        logging.warning("⚠️ Precomputed forecast lookup failed (%r), running live inference for %ss",
+                        e, PRECOMPUTED_BACKOFF)
+        return None
+    finally:
+        stages['db_precomputed'] = time.perf_counter() - start
+
+
+async def forecast_response(req: ForecastRequest, request: Request, model_path: str, stages: dict) -> Response:
+    fmt = negotiate_format(request)
+
+    if req.include_intervals and req.engine != "prophet":
+        raise HTTPException(status_code=422, detail="Uncertainty intervals are only available with the prophet engine.")
     if not os.path.exists(model_path):
         raise HTTPException(status_code=404, detail="Model not found for this country.")
 
-    try:
-        model: Prophet = joblib.load(model_path)
+    # A warm in-process cache answers without touching the database
+    start = time.perf_counter()
+    forecast = cached_forecast(model_path, req.freq, req.periods, req.include_intervals)
+    stages['forecast_cache'] = time.perf_counter() - start
 
-        async with AsyncSessionLocal() as session:
-            df = await fetch_data(session, country=req.country, freq=req.freq)
+    # The precomputed table holds Prophet forecasts; other engines are cheap enough to run live
+    if forecast is None and not req.include_intervals and req.engine == "prophet":
+        forecast = await lookup_precomputed(req, model_path, stages)
 
-        future = model.make_future_dataframe(periods=req.periods, freq=req.freq)
-        forecast = model.predict(future)[['ds', 'yhat']]
-        forecast.rename(columns={'ds': 'Date', 'yhat': 'Predicted Sales'}, inplace=True)
+    if forecast is None:
+        try:
+            forecast = await run_inference(stages, run_forecast, model_path, req.freq, req.periods, req.include_intervals)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logging.exception("❌ Exception during prediction")
+            raise HTTPException(status_code=500, detail=str(e))
 
-        return forecast.tail(req.periods).to_dict(orient='records')
+    start = time.perf_counter()
+    response = render_forecast(forecast, fmt)
+    stages['serialize'] = time.perf_counter() - start
+    return response
 
-    except Exception as e:
-        logging.exception("❌ Exception during prediction")
-        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/predict/batch")
+async def predict_batch(req: BatchForecastRequest, request: Request):
+    """
+    Forecast many (country, freq, periods) items in one call.
+    Items sharing a model run together in one pool task; failures are reported per item.
+    With Accept: application/x-ndjson each item is streamed as its model finishes.
+    """
+    fmt = negotiate_format(request)
+    if fmt == "arrow":
+        raise HTTPException(status_code=406, detail="Arrow output is only available on /predict.")
+    if len(req.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=422, detail=f"At most {BATCH_MAX_ITEMS} items per batch.")
+
+    missing = []
+    groups = {}
+    for i, item in enumerate(req.items):
+        model_path = model_path_for(item.country, item.include_intervals, item.engine)
+        if item.include_intervals and item.engine != "prophet":
+            missing.append((i, 422, "Uncertainty intervals are only available with the prophet engine."))
+            continue
+        if not os.path.exists(model_path):
+            missing.append((i, 404, "Model not found for this country."))
+            continue
+        groups.setdefault(model_path, []).append(i)
+
+    def record(group):
+        for i, status, _ in group:
+            item = req.items[i]
+            country = item.country if status not in (404, 422) else "unknown"
+            REQUESTS.labels("batch", country, item.freq, str(status)).inc()
+        return group
+
+    # Groups of one batch take at most `workers` pool slots at a time, so a batch with
+    # many models queues behind itself instead of being turned away with 503
+    group_slots = asyncio.Semaphore(inference_pool.workers)
+
+    async def run_group(model_path, indices):
+        items = [(req.items[i].freq, req.items[i].periods, req.items[i].include_intervals) for i in indices]
+        start = time.perf_counter()
+        try:
+            async with group_slots:
+                forecasts = await inference_pool.run(run_forecast_group, model_path, items)
+        except HTTPException as e:
+            return record([(i, e.status_code, e.detail) for i in indices])
+        except Exception as e:
+            logging.exception("❌ Exception during batch prediction")
+            forecasts = [(str(e), {})] * len(indices)
+        worker_time = 0.0
+        for _, item_stages in forecasts:
+            observe_stages(item_stages)
+            worker_time += sum(item_stages.values())
+        observe_stages({"pool_wait": max(0.0, time.perf_counter() - start - worker_time)})
+        return record([(i, 500, f) if isinstance(f, str) else (i, 200, f) for i, (f, _) in zip(indices, forecasts)])
+
+    record(missing)
+    tasks = [asyncio.ensure_future(run_group(path, indices)) for path, indices in groups.items()]
+
+    if fmt == "ndjson":
+        async def stream():
+            try:
+                for i, status, result in missing:
+                    yield dumps({"index": i, **batch_entry(req.items[i], status, result, fmt)}) + b"\n"
+                for done in asyncio.as_completed(tasks):
+                    for i, status, result in await done:
+                        yield dumps({"index": i, **batch_entry(req.items[i], status, result, fmt)}) + b"\n"
+            finally:
+                for task in tasks:
+                    task.cancel()
+        return StreamingResponse(stream(), media_type=NDJSON)
+
+    results = dict((i, (status, result)) for i, status, result in missing)
+    for group in await asyncio.gather(*tasks):
+        for i, status, result in group:
+            results[i] = (status, result)
+    response = [batch_entry(item, *results[i], fmt) for i, item in enumerate(req.items)]
+    return Response(content=dumps(response), media_type=JSON)
@@ -0,0 +1,97 @@
+"""
+Inference benchmarks for the forecast API.
+
+Point-forecast fast path against Prophet.predict for one model:
+    python bench_inference.py predict ../models/prophet_model_United_Kingdom.pkl --periods 60
+
+Load time and RSS of a pickle against its compact parameter artifact:
+    python bench_inference.py load ../models/prophet_model_United_Kingdom.pkl ../models/prophet_model_United_Kingdom.json
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from forecasting import prophet_params, future_dates, point_forecast, load_model
+
+# Run in a fresh interpreter per artifact so RSS isn't shared between the two loads
+LOAD_PROBE = """
+import resource, sys, time
+from forecasting import load_model
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+model = load_model(sys.argv[1])
+elapsed = (time.perf_counter() - start) * 1000
+rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(elapsed, (rss_after - rss_before) / 1024)
+"""
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+
+def bench_predict(args):
+    model = joblib.load(args.model_path)
+    params = prophet_params(model)
+    if params is None:
+        print("❌ Model uses features the fast path doesn't support")
+        return
+
+    future = model.make_future_dataframe(periods=args.periods, freq=args.freq, include_history=False)
+    dates = pd.DatetimeIndex(future['ds'])
+    prophet_out, prophet_ms = timed(lambda: model.predict(future)['yhat'].to_numpy(), args.repeat)
+    fast_out, fast_ms = timed(lambda: point_forecast(params, future_dates(params['last_ds'], args.periods, args.freq)), args.repeat)
+
+    assert (future_dates(params['last_ds'], args.periods, args.freq) == dates).all()
+    max_diff = np.max(np.abs(prophet_out - fast_out))
+    print(f"Prophet.predict : {prophet_ms:8.2f} ms/request")
+    print(f"point_forecast  : {fast_ms:8.2f} ms/request ({prophet_ms / fast_ms:.0f}x faster)")
+    print(f"max |yhat diff| : {max_diff:.3e}")
+    if not np.allclose(prophet_out, fast_out, rtol=1e-6, atol=1e-6):
+        print("❌ Fast path diverges from Prophet.predict")
+
+
+def bench_load(args):
+    print(f"{'artifact':<60} {'load ms':>10} {'RSS MiB':>10}")
+    for path in args.paths:
+        out = subprocess.run([sys.executable, "-c", LOAD_PROBE, os.path.abspath(path)],
+                             cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True, check=True).stdout.split()
+        print(f"{path:<60} {float(out[0]):>10.1f} {float(out[1]):>10.1f}")
+
+    # Warm loads in this process: what a model cache miss costs once imports are done
+    for path in args.paths:
+        _, ms = timed(lambda: load_model(path), args.repeat)
+        print(f"warm load {path:<50} {ms:>10.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    predict = sub.add_parser("predict")
+    predict.add_argument("model_path")
+    predict.add_argument("--freq", default="D")
+    predict.add_argument("--periods", type=int, default=60)
+    predict.add_argument("--repeat", type=int, default=20)
+    load = sub.add_parser("load")
+    load.add_argument("paths", nargs="+")
+    load.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "predict":
+        bench_predict(args)
+    else:
+        bench_load(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import os
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from model_params import prophet_params, future_dates, point_forecast
+
+# CONFIG
+MODEL_CACHE_SIZE = int(os.environ.get('MODEL_CACHE_SIZE', '16'))
+FORECAST_CACHE_SIZE = int(os.environ.get('FORECAST_CACHE_SIZE', '256'))
+FORECAST_CACHE_TTL = float(os.environ.get('FORECAST_CACHE_TTL', '3600'))
+# Forecasts are computed at least this far ahead so shorter requests are served by slicing
+FORECAST_MIN_HORIZON = int(os.environ.get('FORECAST_MIN_HORIZON', '60'))
+
+
+def load_params(path: str) -> dict:
+    """
+    Load a compact parameter artifact (<stem>.json + packed .npy written by the trainer).
+    Arrays are memory-mapped, so workers on the same node share their pages.
+    """
+    with open(path) as f:
+        params = json.load(f)
+    layout = params.pop('arrays')
+    packed = np.load(os.path.join(os.path.dirname(path), layout.pop('file')), mmap_mode='r')
+    for name, (offset, length) in layout.items():
+        params[name] = packed[offset:offset + length]
+    return params
+
+
+def load_model(path: str):
+    """A compact parameter dict for .json artifacts, the unpickled Prophet object otherwise."""
+    if path.endswith('.json'):
+        return load_params(path)
+    return joblib.load(path)
+
+
+def file_version(path: str) -> tuple:
+    """Cheap on-disk version of a model file: changes whenever the file is rewritten."""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+_digests = {}
+
+
+def model_digest(path: str) -> str:
+    """
+    Version of a model file as recorded by the trainer: the content hash of a pickle,
+    or the `model_version` stored in a parameter artifact.
+    The file is only re-read when its on-disk version changes.
+    """
+    version = file_version(path)
+    cached = _digests.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    if path.endswith('.json'):
+        with open(path) as f:
+            digest = json.load(f)['model_version']
+    else:
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    _digests[path] = (version, digest)
+    return digest
+
+
+class ModelCache:
+    """
+    LRU cache of loaded models (Prophet objects or parameter artifacts) keyed by path.
+    Each entry remembers the file version it was loaded from, so a model
+    republished on disk is reloaded on the next lookup.
+    """
+
+    def __init__(self, max_size: int = MODEL_CACHE_SIZE, loader=load_model):
+        self.max_size = max_size
+        self.loader = loader
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def get(self, path: str):
+        """Return (model, version) for `path`, loading it from disk only on a miss."""
+        version = file_version(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1], version
+
+        # Load outside the lock so one slow unpickle doesn't block other models
+        model = self.loader(path)
+        with self._lock:
+            if path in self._entries:
+                self.reloads += 1
+            else:
+                self.misses += 1
+            self._entries[path] = (version, model)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return model, version
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+            }
+
+
+model_cache = ModelCache()
+
+
+class ForecastCache:
+    """
+    TTL + LRU cache of forecast frames keyed by (model path, model version, freq, intervals).
+    Only the longest horizon computed so far is kept per key; shorter
+    requests get the first `periods` rows of it.
+    """
+
+    def __init__(self, max_size: int = FORECAST_CACHE_SIZE, ttl: float = FORECAST_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple, periods: int, record_miss: bool = True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._drop_stale_versions(key)
+            elif entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            elif len(entry[1]) >= periods:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1].head(periods)
+            if record_miss:
+                self.misses += 1
+            return None
+
+    def put(self, key: tuple, forecast):
+        with self._lock:
+            self._drop_stale_versions(key)
+            self._entries[key] = (time.monotonic() + self.ttl, forecast)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _drop_stale_versions(self, key: tuple):
+        # A new model file was published: forget forecasts made by the old one
+        path, version = key[0], key[1]
+        stale = [k for k in self._entries if k[0] == path and k[1] != version]
+        for k in stale:
+            del self._entries[k]
+        self.invalidations += len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+forecast_cache = ForecastCache()
+
+
+def cached_forecast(model_path: str, freq: str, periods: int, include_intervals: bool = False):
+    """
+    The forecast from this process's cache, or None. Cheap enough for the event loop;
+    a miss isn't counted, since run_forecast will look again and count it.
+    """
+    key = (model_path, file_version(model_path), freq, include_intervals)
+    return forecast_cache.get(key, periods, record_miss=False)
+
+
+def run_forecast(model_path: str, freq: str, periods: int, include_intervals: bool = False):
+    """
+    Forecast `periods` steps ahead with the model at `model_path`, served from cache when possible.
+    Returns (forecast frame, {stage: seconds}); timings travel with the result so
+    they survive a process pool.
+    """
+    stages = {}
+    start = time.perf_counter()
+    key = (model_path, file_version(model_path), freq, include_intervals)
+    forecast = forecast_cache.get(key, periods)
+    stages['forecast_cache'] = time.perf_counter() - start
+    if forecast is not None:
+        return forecast, stages
+
+    start = time.perf_counter()
+    model, version = model_cache.get(model_path)
+    stages['model_load'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    horizon = max(periods, FORECAST_MIN_HORIZON)
+    if isinstance(model, dict):
+        if include_intervals:
+            raise ValueError("Uncertainty intervals need the pickled Prophet model.")
+        params = model
+    else:
+        params = None if include_intervals else prophet_params(model)
+
+    if params is not None:
+        dates = future_dates(params['last_ds'], horizon, freq)
+        forecast = pd.DataFrame({'Date': dates, 'Predicted Sales': point_forecast(params, dates)})
+    else:
+        # Only the future rows are returned, so don't predict over the training history
+        future = model.make_future_dataframe(periods=horizon, freq=freq, include_history=False)
+        forecast = model.predict(future)
+        columns = {'ds': 'Date', 'yhat': 'Predicted Sales'}
+        if include_intervals:
+            columns.update({'yhat_lower': 'Lower Bound', 'yhat_upper': 'Upper Bound'})
+        forecast = forecast[list(columns)].rename(columns=columns)
+    stages['predict'] = time.perf_counter() - start
+
+    forecast_cache.put((model_path, version, freq, include_intervals), forecast)
+    return forecast.head(periods), stages
+
+
+def run_forecast_group(model_path: str, items: list) -> list:
+    """
+    Forecast several (freq, periods, include_intervals) items with one model.
+    Longest horizons go first so the shorter ones are sliced from the cache.
+    Returns one (forecast frame or error string, stages) pair per item, in input order.
+    """
+    results = [None] * len(items)
+    order = sorted(range(len(items)), key=lambda i: -items[i][1])
+    for i in order:
+        freq, periods, include_intervals = items[i]
+        try:
+            results[i] = run_forecast(model_path, freq, periods, include_intervals)
+        except Exception as e:
+            results[i] = (str(e), {})
+    return results
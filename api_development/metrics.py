@@ -0,0 +1,62 @@
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily, REGISTRY
+
+# Latency buckets from sub-millisecond cache hits up to cold Prophet predictions
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUESTS = Counter(
+    "forecast_requests_total", "Forecast requests by endpoint, country, frequency and HTTP status",
+    ["endpoint", "country", "freq", "status"])
+REQUEST_LATENCY = Histogram(
+    "forecast_request_seconds", "End-to-end latency of forecast endpoints",
+    ["endpoint"], buckets=BUCKETS)
+STAGE_LATENCY = Histogram(
+    "forecast_stage_seconds",
+    "Time spent per stage: db_precomputed, db_history, pool_wait, forecast_cache, model_load, predict, serialize",
+    ["stage"], buckets=BUCKETS)
+
+
+def observe_stages(stages: dict):
+    for stage, seconds in stages.items():
+        STAGE_LATENCY.labels(stage).observe(seconds)
+
+
+class RuntimeCollector:
+    """Scrape-time gauges for the async DB pool, the inference pool and the in-process caches."""
+
+    def __init__(self, engine, inference_pool, caches: dict):
+        self.engine = engine
+        self.inference_pool = inference_pool
+        self.caches = caches
+
+    def collect(self):
+        pool = self.engine.sync_engine.pool
+        db = GaugeMetricFamily("forecast_db_pool_connections", "Async DB pool connections by state", labels=["state"])
+        db.add_metric(["size"], pool.size())
+        db.add_metric(["checked_out"], pool.checkedout())
+        db.add_metric(["checked_in"], pool.checkedin())
+        db.add_metric(["overflow"], pool.overflow())
+        yield db
+
+        stats = self.inference_pool.stats()
+        inference = GaugeMetricFamily("forecast_inference_pool", "Inference pool occupancy", labels=["state"])
+        for state in ("workers", "limit", "in_flight", "queued"):
+            inference.add_metric([state], stats[state])
+        yield inference
+        rejected = CounterMetricFamily("forecast_inference_rejected", "Requests turned away because the pool was full")
+        rejected.add_metric([], stats["rejected"])
+        yield rejected
+
+        events = CounterMetricFamily("forecast_cache_events", "Cache hits, misses and evictions", labels=["cache", "event"])
+        size = GaugeMetricFamily("forecast_cache_entries", "Entries held per cache", labels=["cache"])
+        for name, cache in self.caches.items():
+            cache_stats = cache.stats()
+            for event in ("hits", "misses", "evictions"):
+                events.add_metric([name, event], cache_stats[event])
+            size.add_metric([name], cache_stats["size"])
+        yield events
+        yield size
+
+
+def register_runtime_collector(engine, inference_pool, caches: dict):
+    REGISTRY.register(RuntimeCollector(engine, inference_pool, caches))
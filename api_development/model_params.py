@@ -0,0 +1,111 @@
+"""
+Forecasting from fitted parameters: the one evaluator for every engine.
+
+A parameter dict uses Prophet's layout (growth, scaling, changepoints_t, k, m,
+delta, beta, seasonalities). The API serves point forecasts with `point_forecast`,
+and the trainer writes its artifacts with `prophet_params` and scores its
+backtests with `point_forecast` too (model_training/engines.py imports this module),
+so what gets trained, backtested and served is the same maths.
+Only NumPy and pandas are needed here.
+"""
+import numpy as np
+import pandas as pd
+
+SECONDS_PER_DAY = 3600 * 24.
+
+
+def prophet_params(model):
+    """
+    Plain-array view of a fitted Prophet model with everything `point_forecast` needs.
+    Returns None for features the fast path doesn't model (logistic growth,
+    holidays, extra regressors, conditional seasonalities).
+    """
+    if model.growth not in ('linear', 'flat'):
+        return None
+    if model.train_holiday_names is not None or model.extra_regressors:
+        return None
+    if any(props['condition_name'] for props in model.seasonalities.values()):
+        return None
+
+    # Column layout of beta follows Prophet's make_all_seasonality_features
+    seasonalities = []
+    col = 0
+    for name, props in model.seasonalities.items():
+        seasonalities.append({
+            'name': name,
+            'period': float(props['period']),
+            'fourier_order': int(props['fourier_order']),
+            'mode': props['mode'],
+            'col': col,
+        })
+        col += 2 * int(props['fourier_order'])
+
+    floor = model.y_min if getattr(model, 'scaling', 'absmax') == 'minmax' else 0.0
+    return {
+        'engine': 'prophet',
+        'growth': model.growth,
+        'start': model.start.value / 1e9,
+        't_scale': model.t_scale.total_seconds(),
+        'y_scale': float(model.y_scale),
+        'floor': float(floor),
+        'last_ds': model.history['ds'].max().value / 1e9,
+        'changepoints_t': np.asarray(model.changepoints_t, dtype=float),
+        'k': float(np.nanmean(model.params['k'])),
+        'm': float(np.nanmean(model.params['m'])),
+        'delta': np.nanmean(model.params['delta'], axis=0),
+        'beta': np.nanmean(model.params['beta'], axis=0),
+        # Not needed for inference, kept so the next training run can warm-start from it
+        'sigma_obs': float(np.nanmean(model.params['sigma_obs'])),
+        'seasonalities': seasonalities,
+    }
+
+
+def future_dates(last_ds: float, periods: int, freq: str) -> pd.DatetimeIndex:
+    """Same dates as Prophet's make_future_dataframe(include_history=False)."""
+    last = pd.Timestamp(last_ds, unit='s')
+    dates = pd.date_range(start=last, periods=periods + 1, freq=freq)
+    return dates[dates > last][:periods]
+
+
+def fourier_features(days: np.ndarray, period: float, order: int) -> np.ndarray:
+    """Prophet's fourier_series: [sin(2πnt/P), cos(2πnt/P)] for n = 1..order, interleaved."""
+    x = 2.0 * np.pi * np.arange(1, order + 1) * days[:, None] / period
+    features = np.empty((len(days), 2 * order))
+    features[:, 0::2] = np.sin(x)
+    features[:, 1::2] = np.cos(x)
+    return features
+
+
+def point_forecast(params: dict, dates) -> np.ndarray:
+    """
+    yhat for `dates` computed directly from the fitted parameters.
+    Matches Prophet.predict()['yhat'] but skips the uncertainty simulation.
+    """
+    secs = pd.DatetimeIndex(dates).values.astype('datetime64[ns]').astype(np.int64) / 1e9
+    t = (secs - params['start']) / params['t_scale']
+
+    # Trend: Prophet.piecewise_linear / flat_trend
+    if params['growth'] == 'flat':
+        trend = np.full_like(t, params['m'])
+    else:
+        cp = np.asarray(params['changepoints_t'])
+        deltas_t = (cp[None, :] <= t[:, None]) * np.asarray(params['delta'])
+        k_t = deltas_t.sum(axis=1) + params['k']
+        m_t = (deltas_t * -cp).sum(axis=1) + params['m']
+        trend = k_t * t + m_t
+    trend = trend * params['y_scale'] + params['floor']
+
+    # Seasonalities: Fourier features times the matching slice of beta
+    days = secs / SECONDS_PER_DAY
+    beta = np.asarray(params['beta'])
+    additive = np.zeros_like(t)
+    multiplicative = np.zeros_like(t)
+    for s in params['seasonalities']:
+        order = s['fourier_order']
+        component = fourier_features(days, s['period'], order) @ beta[s['col']:s['col'] + 2 * order]
+        if s['mode'] == 'additive':
+            additive += component * params['y_scale']
+        else:
+            multiplicative += component
+
+    return trend * (1 + multiplicative) + additive
@@ -0,0 +1,100 @@
+import json
+import os
+
+import pandas as pd
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # plain json still works, just slower
+    orjson = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow output is only offered when pyarrow is installed
+    pa = None
+
+# MEDIA TYPES
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.forecast.columnar+json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+NDJSON = "application/x-ndjson"
+
+FORMATS = {"records": JSON, "columnar": COLUMNAR_JSON, "arrow": ARROW_STREAM, "ndjson": NDJSON}
+# Record-oriented forecasts longer than this are streamed in chunks; keep it well below
+# MAX_PERIODS in app.py, or no /predict response is long enough to stream
+STREAM_MIN_ROWS = int(os.environ.get('STREAM_MIN_ROWS', '1000'))
+STREAM_CHUNK_ROWS = 1000
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def negotiate_format(request: Request) -> str:
+    """Pick the output format from ?format=... or, failing that, the Accept header."""
+    fmt = request.query_params.get("format")
+    if fmt:
+        if fmt not in FORMATS:
+            raise HTTPException(status_code=406, detail=f"Unknown format, expected one of {sorted(FORMATS)}.")
+        return fmt
+    accept = request.headers.get("accept", "")
+    for fmt in ("arrow", "columnar", "ndjson"):
+        if FORMATS[fmt] in accept:
+            return fmt
+    return "records"
+
+
+def forecast_columns(forecast: pd.DataFrame) -> dict:
+    """Column name -> list of JSON-ready values; dates use the same ISO form FastAPI produced."""
+    columns = {}
+    for name in forecast.columns:
+        values = forecast[name]
+        if name == 'Date':
+            columns[name] = pd.to_datetime(values).dt.strftime('%Y-%m-%dT%H:%M:%S').tolist()
+        else:
+            columns[name] = values.astype(float).tolist()
+    return columns
+
+
+def forecast_records(forecast: pd.DataFrame) -> list:
+    columns = forecast_columns(forecast)
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def _stream_records(forecast: pd.DataFrame):
+    yield b"["
+    for start in range(0, len(forecast), STREAM_CHUNK_ROWS):
+        chunk = dumps(forecast_records(forecast.iloc[start:start + STREAM_CHUNK_ROWS]))[1:-1]
+        yield (b"," if start else b"") + chunk
+    yield b"]"
+
+
+def render_forecast(forecast: pd.DataFrame, fmt: str) -> Response:
+    """Serialize one forecast frame in the negotiated format."""
+    if fmt == "arrow":
+        if pa is None:
+            raise HTTPException(status_code=406, detail="Arrow output needs pyarrow on the server.")
+        table = pa.Table.from_pandas(forecast, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_STREAM)
+    if fmt == "columnar":
+        return Response(content=dumps(forecast_columns(forecast)), media_type=COLUMNAR_JSON)
+    if len(forecast) > STREAM_MIN_ROWS:
+        return StreamingResponse(_stream_records(forecast), media_type=JSON)
+    return Response(content=dumps(forecast_records(forecast)), media_type=JSON)
+
+
+def batch_entry(item, status: int, result, fmt: str) -> dict:
+    entry = {"country": item.country, "freq": item.freq, "periods": item.periods, "status": status}
+    if status == 200:
+        entry["forecast"] = forecast_columns(result) if fmt == "columnar" else forecast_records(result)
+    else:
+        entry["error"] = result
+    return entry
@@ -68,6 +68,16 @@ def fetch_data(conn, query):
         st.error(f"Error fetching data: {e}")
         return pd.DataFrame()
 
+def rollup_ready(conn):
+    """True when the daily_sales_by_country rollup exists and has rows."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT EXISTS (SELECT 1 FROM daily_sales_by_country)")
+            return cur.fetchone()[0]
+    except psycopg2.Error:
+        conn.rollback()
+        return False
+
 def create_line_chart(df):
     if df.empty:
         return None
@@ -368,19 +378,36 @@ def main():
             return
 
         # Fetch sales data
-        sales_query = """
-            SELECT
-                "InvoiceDate",
-                SUM("Quantity" * "UnitPrice") AS "SaleAmount",
-                CASE 
-                WHEN random() < 0.3 THEN 'Organic'
-                ELSE 'Paid'
-                END AS "MarketingChannel",
-                "Country" AS "Store"
-            FROM online_retail_data
-            GROUP BY "InvoiceDate", "Country"
-            ORDER BY "InvoiceDate"
-        """
+        if rollup_ready(conn):
+            # Daily totals from the rollup instead of a scan of every line item
+            sales_query = """
+                SELECT
+                    day AS "InvoiceDate",
+                    sales AS "SaleAmount",
+                    CASE
+                    WHEN random() < 0.3 THEN 'Organic'
+                    ELSE 'Paid'
+                    END AS "MarketingChannel",
+                    country AS "Store"
+                FROM daily_sales_by_country
+                ORDER BY day
+            """
+        else:
+            sales_query = """
+                SELECT
+                    "InvoiceDate"::date AS "InvoiceDate",
+                    SUM("Quantity" * "UnitPrice") AS "SaleAmount",
+                    CASE 
+                    WHEN random() < 0.3 THEN 'Organic'
+                    ELSE 'Paid'
+                    END AS "MarketingChannel",
+                    "Country" AS "Store"
+                FROM online_retail_data
+                -- Same rows and daily grain as daily_sales_by_country
+                WHERE "Quantity" > 0 AND "UnitPrice" > 0
+                GROUP BY 1, "Country"
+                ORDER BY 1
+            """
         sales_df = fetch_data(conn, sales_query)
 
         # Simulate opportunity data
@@ -495,7 +522,9 @@ def main():
                 }
 
                 try:
-                    response = requests.post("https://api.willdzai04.asia/predict", json=payload)
+                    # Columnar JSON: one list per column instead of one object per row
+                    response = requests.post("https://api.willdzai04.asia/predict", json=payload,
+                                             headers={"Accept": "application/vnd.forecast.columnar+json"})
                     response.raise_for_status()
                     forecast_data = response.json()
                     forecast_df = pd.DataFrame(forecast_data)
@@ -0,0 +1,112 @@
+"""
+Benchmark of the hot read queries against online_retail_data.
+
+Every query runs with the planner free to use the loader's indexes and again with
+index scans disabled (SET LOCAL), which stands in for the table before indexing:
+    python bench_queries.py --country "United Kingdom" --repeat 5
+    python bench_queries.py --explain      # also print the plan of each query
+"""
+import argparse
+import os
+import statistics
+import time
+
+import psycopg2
+
+QUERIES = {
+    # API fetch_data, daily and monthly
+    "api_country_daily": '''
+        SELECT date_trunc('day', "InvoiceDate") AS ds, SUM("Quantity" * "UnitPrice")::float8 AS y
+        FROM online_retail_data
+        WHERE "Quantity" > 0 AND "UnitPrice" > 0 AND "Country" = %(country)s
+        GROUP BY 1 ORDER BY 1
+    ''',
+    "api_country_monthly": '''
+        SELECT date_trunc('month', "InvoiceDate") AS ds, SUM("Quantity" * "UnitPrice")::float8 AS y
+        FROM online_retail_data
+        WHERE "Quantity" > 0 AND "UnitPrice" > 0 AND "Country" = %(country)s
+        GROUP BY 1 ORDER BY 1
+    ''',
+    # One country over the last three months: partition pruning plus the country index
+    "country_recent": '''
+        SELECT date_trunc('day', "InvoiceDate") AS ds, SUM("Quantity" * "UnitPrice")::float8 AS y
+        FROM online_retail_data
+        WHERE "Country" = %(country)s
+          AND "InvoiceDate" >= (SELECT max("InvoiceDate") FROM online_retail_data) - interval '3 months'
+        GROUP BY 1 ORDER BY 1
+    ''',
+    # Trainer load_daily_sales
+    "trainer_daily": '''
+        SELECT "Country", date_trunc('day', "InvoiceDate") AS ds,
+               SUM("Quantity" * "UnitPrice")::float8 AS y, COUNT(*) AS n
+        FROM online_retail_data
+        WHERE "Quantity" > 0 AND "UnitPrice" > 0
+        GROUP BY 1, 2
+    ''',
+    # Dashboard fallback sales_query (without the random() channel column)
+    "dashboard_sales": '''
+        SELECT "InvoiceDate"::date AS "InvoiceDate", SUM("Quantity" * "UnitPrice") AS "SaleAmount", "Country" AS "Store"
+        FROM online_retail_data
+        WHERE "Quantity" > 0 AND "UnitPrice" > 0
+        GROUP BY 1, "Country"
+        ORDER BY 1
+    ''',
+}
+
+NO_INDEXES = "SET LOCAL enable_indexscan = off; SET LOCAL enable_indexonlyscan = off; SET LOCAL enable_bitmapscan = off"
+
+
+def run(conn, query, params, repeat, disable_indexes):
+    timings = []
+    with conn.cursor() as cursor:
+        for _ in range(repeat):
+            if disable_indexes:
+                cursor.execute(NO_INDEXES)
+            start = time.perf_counter()
+            cursor.execute(query, params)
+            cursor.fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+            conn.rollback()
+    return statistics.median(timings)
+
+
+def explain(conn, query, params, disable_indexes):
+    with conn.cursor() as cursor:
+        if disable_indexes:
+            cursor.execute(NO_INDEXES)
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+        conn.rollback()
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the hot queries with and without index scans.")
+    parser.add_argument("--country", default="United Kingdom")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--queries", nargs="*", default=list(QUERIES), choices=list(QUERIES))
+    parser.add_argument("--explain", action="store_true")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        host=os.environ.get('POSTGRES_HOST', 'localhost'),
+        database=os.environ.get('POSTGRES_DB', 'your_database'),
+        user=os.environ.get('POSTGRES_USER', 'your_user'),
+        password=os.environ.get('POSTGRES_PASSWORD', 'your_password')
+    )
+    params = {"country": args.country}
+    print(f"{'query':<22} {'no indexes':>12} {'indexed':>12} {'speedup':>8}")
+    for name in args.queries:
+        query = QUERIES[name]
+        run(conn, query, params, 1, False)  # warm the cache
+        before = run(conn, query, params, args.repeat, True)
+        after = run(conn, query, params, args.repeat, False)
+        print(f"{name:<22} {before:10.1f}ms {after:10.1f}ms {before / after:7.1f}x")
+        if args.explain:
+            print(explain(conn, query, params, False))
+            print()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
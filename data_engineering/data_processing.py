@@ -1,142 +1,477 @@
 import pandas as pd
 import subprocess
 import os
+import itertools
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 import psycopg2
 from psycopg2 import sql
 import numpy as np
-import csv
+import openpyxl
+import pyarrow as pa
+import pyarrow.parquet as pq
 from io import StringIO
 
-def load_data_to_postgres(df, table_name, host, database, user, password):
-    try:
-        conn = psycopg2.connect(
-            host=host,
-            database=database,
-            user=user,
-            password=password
-        )
-        cursor = conn.cursor()
-
-        # Create table if it doesn't exist
-        columns_with_types = []
-        for col, dtype in zip(df.columns, df.dtypes):
-            if col == 'InvoiceNo':
-                pg_dtype = 'TEXT'
-            elif col == 'StockCode':
-                pg_dtype = 'TEXT'
-            elif col == 'Description':
-                pg_dtype = 'TEXT'
-            elif col == 'Quantity':
-                pg_dtype = 'INTEGER'
-            elif col == 'InvoiceDate':
-                pg_dtype = 'TIMESTAMP'
-            elif col == 'UnitPrice':
-                pg_dtype = 'NUMERIC'
-            elif col == 'CustomerID':
-                pg_dtype = 'NUMERIC'
-            elif col == 'Country':
-                pg_dtype = 'TEXT'
-            columns_with_types.append(sql.Composed([sql.Identifier(col), sql.SQL(' ' + pg_dtype)]))
-
-        create_table_query = sql.SQL("""
-            CREATE TABLE IF NOT EXISTS {} (
-                {}
-            )
-        """).format(
+from rollup import ROLLUP_TABLE, rebuild_rollup, rollup_upsert
+
+COLUMNS = ['InvoiceNo', 'StockCode', 'Description', 'Quantity', 'InvoiceDate', 'UnitPrice', 'CustomerID', 'Country']
+TEXT_COLUMNS = ['InvoiceNo', 'StockCode', 'Description', 'Country']
+# Identifies a line item across loads; re-loading a row with a known key is a no-op
+NATURAL_KEY = ['InvoiceNo', 'StockCode', 'InvoiceDate']
+# Rows missing any of these are dropped
+REQUIRED_COLUMNS = ['InvoiceNo', 'StockCode', 'InvoiceDate', 'Quantity', 'UnitPrice']
+# Rows parsed, cleaned and COPYed at a time; memory scales with this, not with the source
+CHUNK_ROWS = int(os.environ.get('LOAD_CHUNK_ROWS', '50000'))
+# Parallel COPY connections
+LOAD_WORKERS = int(os.environ.get('LOAD_WORKERS', '1'))
+# Types of the parsed source as cached in Parquet, so every chunk has the same schema
+SOURCE_SCHEMA = pa.schema([
+    ('InvoiceNo', pa.string()),
+    ('StockCode', pa.string()),
+    ('Description', pa.string()),
+    ('Quantity', pa.float64()),
+    ('InvoiceDate', pa.timestamp('ns')),
+    ('UnitPrice', pa.float64()),
+    ('CustomerID', pa.float64()),
+    ('Country', pa.string()),
+])
+
+def create_table(cursor, table_name):
+    columns_with_types = []
+    for col in COLUMNS:
+        if col == 'InvoiceNo':
+            pg_dtype = 'TEXT'
+        elif col == 'StockCode':
+            pg_dtype = 'TEXT'
+        elif col == 'Description':
+            pg_dtype = 'TEXT'
+        elif col == 'Quantity':
+            pg_dtype = 'INTEGER'
+        elif col == 'InvoiceDate':
+            pg_dtype = 'TIMESTAMP'
+        elif col == 'UnitPrice':
+            pg_dtype = 'NUMERIC'
+        elif col == 'CustomerID':
+            pg_dtype = 'NUMERIC'
+        elif col == 'Country':
+            pg_dtype = 'TEXT'
+        columns_with_types.append(sql.Composed([sql.Identifier(col), sql.SQL(' ' + pg_dtype)]))
+
+    # An unpartitioned table from an older loader is moved into the partitioned layout
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL, to_regclass(%s) IN (SELECT partrelid FROM pg_partitioned_table)",
+                   (table_name, table_name))
+    exists, partitioned = cursor.fetchone()
+    legacy_table = f"{table_name}_unpartitioned"
+    if exists and not partitioned:
+        print(f"🔀 Moving `{table_name}` into monthly partitions")
+        cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+            sql.Identifier(table_name), sql.Identifier(legacy_table)
+        ))
+        cursor.execute(sql.SQL("ALTER INDEX IF EXISTS {} RENAME TO {}").format(
+            sql.Identifier(f"{table_name}_natural_key"), sql.Identifier(f"{legacy_table}_natural_key")
+        ))
+
+    create_table_query = sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {} (
+            {}
+        ) PARTITION BY RANGE ("InvoiceDate")
+    """).format(
+        sql.Identifier(table_name),
+        sql.SQL(', ').join(columns_with_types)
+    )
+    cursor.execute(create_table_query)
+    # Rows outside every monthly partition (e.g. streamed in by the Kafka consumer) land here
+    cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} DEFAULT").format(
+        sql.Identifier(f"{table_name}_default"), sql.Identifier(table_name)
+    ))
+
+    if exists and not partitioned:
+        ensure_partitions(cursor, table_name, legacy_table)
+        columns = sql.SQL(', ').join(map(sql.Identifier, COLUMNS))
+        cursor.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {}").format(
+            sql.Identifier(table_name), columns, columns, sql.Identifier(legacy_table)
+        ))
+        cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(legacy_table)))
+
+
+def create_month_partition(cursor, table_name, month):
+    """
+    Partition of `table_name` for the calendar month starting at `month`, if missing.
+    Rows of that month already sitting in the DEFAULT partition are moved into it.
+    """
+    partition = f"{table_name}_p{month:%Y_%m}"
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (partition,))
+    if cursor.fetchone()[0]:
+        return
+    upper = (month.replace(day=1) + timedelta(days=32)).replace(day=1)
+    default = sql.Identifier(f"{table_name}_default")
+    in_month = sql.SQL('"InvoiceDate" >= %s AND "InvoiceDate" < %s')
+
+    # Postgres refuses to add a partition while the default one holds rows that belong to it
+    cursor.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {} WHERE {})").format(default, in_month), (month, upper))
+    moving = cursor.fetchone()[0]
+    if moving:
+        cursor.execute(sql.SQL("CREATE TEMP TABLE IF NOT EXISTS partition_moves (LIKE {}) ON COMMIT DROP").format(
+            sql.Identifier(table_name)
+        ))
+        cursor.execute("TRUNCATE partition_moves")
+        cursor.execute(sql.SQL("""
+            WITH moved AS (DELETE FROM {} WHERE {} RETURNING *)
+            INSERT INTO partition_moves SELECT * FROM moved
+        """).format(default, in_month), (month, upper))
+
+    cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(
+        sql.Identifier(partition), sql.Identifier(table_name)
+    ), (month, upper))
+    if moving:
+        cursor.execute(sql.SQL("INSERT INTO {} SELECT * FROM partition_moves").format(sql.Identifier(table_name)))
+
+
+def ensure_partitions(cursor, table_name, source_table):
+    """Create the monthly partitions `table_name` needs to take every row of `source_table`."""
+    cursor.execute(sql.SQL("""
+        SELECT DISTINCT date_trunc('month', "InvoiceDate") FROM {} WHERE "InvoiceDate" IS NOT NULL ORDER BY 1
+    """).format(sql.Identifier(source_table)))
+    for (month,) in cursor.fetchall():
+        create_month_partition(cursor, table_name, month)
+
+
+def create_indexes(cursor, table_name):
+    """
+    Indexes for the merge and the hot read paths. Built after the bulk load (IF NOT EXISTS),
+    so a first load fills the table without maintaining them; later loads keep them up to date.
+    """
+    indexes = {
+        # Natural key, looked up by every merge
+        'natural_key': (NATURAL_KEY, []),
+        # One country's history: API fetch_data and the trainer
+        'country_date': (['Country', 'InvoiceDate'], ['Quantity', 'UnitPrice']),
+        # Sales per date and country: the dashboard, scanned in date order
+        'date_country': (['InvoiceDate', 'Country'], ['Quantity', 'UnitPrice']),
+    }
+    for suffix, (keys, included) in indexes.items():
+        query = sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} ({})").format(
+            sql.Identifier(f"{table_name}_{suffix}"),
             sql.Identifier(table_name),
-            sql.SQL(', ').join(columns_with_types)
+            sql.SQL(', ').join(map(sql.Identifier, keys))
         )
+        if included:
+            query += sql.SQL(" INCLUDE ({})").format(sql.SQL(', ').join(map(sql.Identifier, included)))
+        cursor.execute(query)
+    cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table_name)))
 
-        cursor.execute(create_table_query)
-        conn.commit()
 
-        # Prepare CSV for COPY
-        output = StringIO()
-        columns = ['InvoiceNo', 'StockCode', 'Description', 'Quantity', 'InvoiceDate', 'UnitPrice', 'CustomerID', 'Country']
-        df = df[columns]
-        df.to_csv(output, index=False, header=False, quoting=csv.QUOTE_ALL)
-        output.seek(0)
+def create_staging_table(cursor, staging_table, table_name):
+    """Empty UNLOGGED copy of the target's columns; COPY lands here before the merge."""
+    cursor.execute(sql.SQL("CREATE UNLOGGED TABLE IF NOT EXISTS {} (LIKE {})").format(
+        sql.Identifier(staging_table), sql.Identifier(table_name)
+    ))
+    cursor.execute(sql.SQL("TRUNCATE {}").format(sql.Identifier(staging_table)))
 
-        copy_sql = f"""
-            COPY {table_name} FROM STDIN WITH CSV NULL '' 
-        """
-        cursor.copy_expert(copy_sql, output)
-        conn.commit()
-        print(f"✅ Data successfully loaded into table `{table_name}`")
+
+def merge_staging(cursor, staging_table, table_name):
+    """
+    Insert the staged rows whose natural key is not in the target yet, add them to the
+    daily rollup in the same statement, then empty the staging table.
+    Rows sharing a key inside one load are all kept, so a first load stores exactly what the
+    source holds and a re-run of the same file inserts nothing. Returns the number of rows inserted.
+    """
+    cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(staging_table)))
+    columns = sql.SQL(', ').join(map(sql.Identifier, COLUMNS))
+    key_match = sql.SQL(' AND ').join(
+        sql.SQL("t.{col} = s.{col}").format(col=sql.Identifier(col)) for col in NATURAL_KEY
+    )
+    cursor.execute(sql.SQL("""
+        WITH inserted AS (
+            INSERT INTO {target} ({columns})
+            SELECT {columns} FROM {staging} s
+            WHERE NOT EXISTS (SELECT 1 FROM {target} t WHERE {key_match})
+            RETURNING {columns}
+        ), rolled_up AS (
+            {rollup_upsert}
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM inserted), (SELECT COUNT(*) FROM rolled_up)
+    """).format(
+        target=sql.Identifier(table_name),
+        staging=sql.Identifier(staging_table),
+        columns=columns,
+        key_match=key_match,
+        rollup_upsert=rollup_upsert("inserted")
+    ))
+    inserted, rollup_rows = cursor.fetchone()
+    print(f"📊 Updated {rollup_rows} rows of `{ROLLUP_TABLE}`")
+    cursor.execute(sql.SQL("TRUNCATE {}").format(sql.Identifier(staging_table)))
+    return inserted
+
+
+def copy_chunk(cursor, table_name, df):
+    """Stream one chunk into `table_name` with a text COPY; only this chunk is rendered as CSV."""
+    output = StringIO()
+    df[COLUMNS].to_csv(output, index=False, header=False, date_format='%Y-%m-%d %H:%M:%S')
+    output.seek(0)
+    copy_sql = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '')").format(
+        sql.Identifier(table_name),
+        sql.SQL(', ').join(map(sql.Identifier, COLUMNS))
+    )
+    cursor.copy_expert(copy_sql, output)
+
+
+def copy_worker(conn, table_name, jobs, failed):
+    """
+    COPY chunks from `jobs` over `conn` until the None sentinel. Keeps draining the queue
+    after a failure so the producer never blocks; committing is left to the caller.
+    """
+    rows = 0
+    error = None
+    with conn.cursor() as cursor:
+        while True:
+            df = jobs.get()
+            if df is None:
+                break
+            if error is not None or failed.is_set():
+                continue
+            try:
+                copy_chunk(cursor, table_name, df)
+                rows += len(df)
+            except Exception as e:
+                error = e
+                failed.set()
+    if error is not None:
+        raise error
+    return rows
+
+
+def parallel_copy(connections, table_name, chunks):
+    """
+    Fan chunks out to one COPY worker per connection. The queue holds at most two chunks
+    per worker, so memory stays bounded however large the source is.
+    """
+    jobs = queue.Queue(maxsize=2 * len(connections))
+    failed = threading.Event()
+    with ThreadPoolExecutor(max_workers=len(connections)) as pool:
+        futures = [pool.submit(copy_worker, conn, table_name, jobs, failed) for conn in connections]
+        try:
+            for df in chunks:
+                if failed.is_set():
+                    break
+                jobs.put(df)
+        finally:
+            for _ in connections:
+                jobs.put(None)
+        return sum(future.result() for future in futures)
+
+
+def load_data_to_postgres(chunks, table_name, host, database, user, password, workers=LOAD_WORKERS):
+    """
+    COPY cleaned chunks as they arrive into `<table_name>_staging`, over `workers` connections,
+    then merge the rows that are new into `table_name` in one transaction.
+    """
+    staging_table = f"{table_name}_staging"
+    connections = []
+    try:
+        for _ in range(max(workers, 1)):
+            connections.append(psycopg2.connect(
+                host=host,
+                database=database,
+                user=user,
+                password=password
+            ))
+        with connections[0].cursor() as cursor:
+            create_table(cursor, table_name)
+            create_staging_table(cursor, staging_table, table_name)
+            # A new rollup starts from whatever the fact table already holds
+            cursor.execute("SELECT to_regclass(%s) IS NULL", (ROLLUP_TABLE,))
+            if cursor.fetchone()[0]:
+                print(f"📊 Building `{ROLLUP_TABLE}` from `{table_name}`")
+                rebuild_rollup(cursor)
+        connections[0].commit()
+
+        start = time.perf_counter()
+        if len(connections) == 1:
+            total = 0
+            with connections[0].cursor() as cursor:
+                for df in chunks:
+                    copy_chunk(cursor, staging_table, df)
+                    total += len(df)
+                    print(f"⬆️ Staged {total} rows so far")
+        else:
+            total = parallel_copy(connections, staging_table, chunks)
+        for conn in connections:
+            conn.commit()
+        elapsed = time.perf_counter() - start
+        print(f"⬆️ Staged {total} rows in {elapsed:.1f}s "
+              f"({total / max(elapsed, 1e-9):,.0f} rows/s over {len(connections)} connections)")
+
+        start = time.perf_counter()
+        with connections[0].cursor() as cursor:
+            ensure_partitions(cursor, table_name, staging_table)
+            inserted = merge_staging(cursor, staging_table, table_name)
+        connections[0].commit()
+        print(f"✅ Data successfully loaded into table `{table_name}` "
+              f"({inserted} new of {total} staged rows, merged in {time.perf_counter() - start:.1f}s)")
+
+        start = time.perf_counter()
+        with connections[0].cursor() as cursor:
+            create_indexes(cursor, table_name)
+        connections[0].commit()
+        print(f"🗂️ Indexes ready in {time.perf_counter() - start:.1f}s")
 
     except Exception as e:
         print(f"❌ Error loading data into PostgreSQL: {e}")
-        conn.rollback()
+        for conn in connections:
+            conn.rollback()
     finally:
-        if conn:
-            cursor.close()
+        for conn in connections:
             conn.close()
 
-def main():
-    data_url = "https://archive.ics.uci.edu/ml/machine-learning-databases/00352/Online%20Retail.xlsx"
-    local_file_path = "../sales-forecasting-platform/data/processed/online_retail.xlsx"
 
-    if not os.path.exists(local_file_path):
-        try:
-            subprocess.run(["wget", data_url, "-O", local_file_path], check=True)
-            print(f"📥 Downloaded data to {local_file_path}")
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Error downloading the dataset: {e}")
-            exit()
-    else:
-        print(f"📁 File already exists at {local_file_path}")
+def normalize_source_chunk(df):
+    """Give a raw chunk the cached schema: text as str (None kept), numbers as float, dates as datetime."""
+    for col in ['InvoiceNo', 'StockCode', 'Description', 'Country']:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    for col in ['Quantity', 'UnitPrice', 'CustomerID']:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'], errors='coerce')
+    return df[COLUMNS]
 
+
+def iter_excel_chunks(path, chunksize=CHUNK_ROWS):
+    """Stream the workbook row by row (openpyxl read-only mode) and yield DataFrame chunks."""
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
     try:
-        df = pd.read_excel(local_file_path)
-        print("✅ Data loaded into Pandas DataFrame")
-    except Exception as e:
-        print(f"❌ Error loading the Excel file: {e}")
-        exit()
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(h).strip() for h in next(rows)]
+        while True:
+            batch = list(itertools.islice(rows, chunksize))
+            if not batch:
+                break
+            yield normalize_source_chunk(pd.DataFrame(batch, columns=header))
+    finally:
+        workbook.close()
+
+
+def iter_source_chunks(excel_path, cache_path, chunksize=CHUNK_ROWS):
+    """
+    Parsed source rows in chunks. Reads the Parquet cache when it is newer than the workbook;
+    otherwise parses the workbook once and writes the cache while streaming.
+    """
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(excel_path):
+        print(f"📦 Reading parsed source from cache {cache_path}")
+        parquet = pq.ParquetFile(cache_path)
+        for batch in parquet.iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+        return
+
+    print(f"📖 Parsing {excel_path} (cached to {cache_path} for later runs)")
+    tmp_path = f"{cache_path}.tmp"
+    writer = pq.ParquetWriter(tmp_path, SOURCE_SCHEMA)
+    try:
+        for chunk in iter_excel_chunks(excel_path, chunksize):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=SOURCE_SCHEMA, preserve_index=False))
+            yield chunk
+    except BaseException:
+        writer.close()
+        os.remove(tmp_path)
+        raise
+    writer.close()
+    os.replace(tmp_path, cache_path)
+
 
-    df.to_csv('online_retail_data.csv', index=False, encoding='utf-8')
-    print("💾 Data saved to online_retail_data.csv")
+def record_stage(stages, name, start, rows):
+    """Add the time since `start` and the rows left after stage `name` to `stages` (if given)."""
+    if stages is None:
+        return
+    entry = stages.setdefault(name, {"seconds": 0.0, "rows": 0})
+    entry["seconds"] += time.perf_counter() - start
+    entry["rows"] += rows
 
-    df_from_csv = pd.read_csv('online_retail_data.csv', encoding='utf-8')
 
-    # === PREPROCESSING STARTS HERE ===
-    print("🔧 Preprocessing data...")
+def report_stages(stages):
+    for name, entry in stages.items():
+        print(f"⏱️ {name:<15} {entry['seconds']:8.3f}s  {entry['rows']:>9} rows")
 
-    # Strip whitespace and convert blank strings ("") to NaN
-    df_from_csv = df_from_csv.map(lambda x: np.nan if isinstance(x, str) and x.strip() == "" else x)
+
+def preprocess(df, stages=None):
+    """
+    Clean one chunk with column-wise operations.
+    Blank strings count as missing; missing Description/Country values end up as the
+    string 'nan', as they did when the data went through a CSV file first.
+    """
+    start = time.perf_counter()
+    record_stage(stages, 'input', start, len(df))
+    df = df.copy(deep=False)
+
+    # Blank or whitespace-only strings -> NaN (only object columns can hold strings)
+    start = time.perf_counter()
+    for col in df.columns[df.dtypes == object]:
+        values = df[col]
+        if pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'mixed', 'mixed-integer'):
+            continue
+        df[col] = values.mask(values.str.strip().eq(''), np.nan)
+    record_stage(stages, 'blanks', start, len(df))
 
     # Drop rows with missing critical values
-    df_from_csv.dropna(subset=['InvoiceNo', 'StockCode', 'InvoiceDate', 'Quantity', 'UnitPrice'], inplace=True)
+    start = time.perf_counter()
+    df = df.dropna(subset=REQUIRED_COLUMNS)
+    record_stage(stages, 'drop_missing', start, len(df))
 
     # Convert to correct types
-    df_from_csv['InvoiceDate'] = pd.to_datetime(df_from_csv['InvoiceDate'], errors='coerce')
-    df_from_csv.dropna(subset=['InvoiceDate'], inplace=True)
+    start = time.perf_counter()
+    df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'], errors='coerce')
+    df = df.dropna(subset=['InvoiceDate'])
+    record_stage(stages, 'parse_dates', start, len(df))
 
-    df_from_csv['Quantity'] = pd.to_numeric(df_from_csv['Quantity'], errors='coerce').fillna(0).astype(int)
-    df_from_csv['UnitPrice'] = pd.to_numeric(df_from_csv['UnitPrice'], errors='coerce').fillna(0.0)
+    start = time.perf_counter()
+    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce').fillna(0).astype(int)
+    df['UnitPrice'] = pd.to_numeric(df['UnitPrice'], errors='coerce').fillna(0.0)
+    df['CustomerID'] = pd.to_numeric(df['CustomerID'], errors='coerce').fillna(0)
+    record_stage(stages, 'numeric', start, len(df))
 
     # Drop invalid values
-    df_from_csv = df_from_csv[(df_from_csv['Quantity'] > 0) & (df_from_csv['UnitPrice'] > 0)]
+    start = time.perf_counter()
+    df = df[(df['Quantity'] > 0) & (df['UnitPrice'] > 0)].copy(deep=False)
+    record_stage(stages, 'filter_invalid', start, len(df))
 
     # Clean text fields, replace blanks with default
-    df_from_csv['InvoiceNo'] = df_from_csv['InvoiceNo'].astype(str).str.strip().replace('', 'UNKNOWN')
-    df_from_csv['StockCode'] = df_from_csv['StockCode'].astype(str).str.strip().replace('', 'UNKNOWN')
-    df_from_csv['Description'] = df_from_csv['Description'].astype(str).str.strip().replace('', 'UNKNOWN')
-    df_from_csv['Country'] = df_from_csv['Country'].astype(str).str.strip().replace('', 'UNKNOWN')
+    start = time.perf_counter()
+    for col in TEXT_COLUMNS:
+        values = df[col]
+        text = values.astype(str).where(values.notna(), 'nan').str.strip()
+        df[col] = text.mask(text.eq(''), 'UNKNOWN')
+    record_stage(stages, 'text', start, len(df))
+    return df
+
+
+def main():
+    data_url = "https://archive.ics.uci.edu/ml/machine-learning-databases/00352/Online%20Retail.xlsx"
+    local_file_path = "../sales-forecasting-platform/data/processed/online_retail.xlsx"
 
-    # Convert CustomerID to float (Postgres NUMERIC)
-    df_from_csv['CustomerID'] = pd.to_numeric(df_from_csv['CustomerID'], errors='coerce').fillna(0)
+    if not os.path.exists(local_file_path):
+        try:
+            subprocess.run(["wget", data_url, "-O", local_file_path], check=True)
+            print(f"📥 Downloaded data to {local_file_path}")
+        except subprocess.CalledProcessError as e:
+            print(f"❌ Error downloading the dataset: {e}")
+            exit()
+    else:
+        print(f"📁 File already exists at {local_file_path}")
 
-    print("✅ Preprocessing complete.")
-    print(df_from_csv.info())
-    print(df_from_csv.describe())
-    # === PREPROCESSING ENDS HERE ===
+    cache_path = os.path.splitext(local_file_path)[0] + ".parquet"
+    # === PREPROCESSING: applied chunk by chunk as the source is streamed ===
+    stages = {}
+    cleaned_chunks = (preprocess(chunk, stages) for chunk in iter_source_chunks(local_file_path, cache_path))
 
     host = os.environ.get('POSTGRES_HOST', 'localhost')
     database = os.environ.get('POSTGRES_DB', 'your_database')
     user = os.environ.get('POSTGRES_USER', 'your_user')
     password = os.environ.get('POSTGRES_PASSWORD', 'your_password')
 
-    load_data_to_postgres(df_from_csv, 'online_retail_data', host, database, user, password)
+    load_data_to_postgres(cleaned_chunks, 'online_retail_data', host, database, user, password)
+    report_stages(stages)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,117 @@
+"""
+daily_sales_by_country: sales per country and day, kept next to online_retail_data.
+
+The batch loader and the Kafka consumer add every line item they insert to it
+(INSERT ... ON CONFLICT DO UPDATE), so readers scan a few thousand rows instead
+of the fact table. Only rows with Quantity > 0 and UnitPrice > 0 count, as in the
+API and the trainer.
+
+    python rollup.py rebuild    # recompute the rollup from online_retail_data
+    python rollup.py verify     # compare it with a fresh aggregation; exit 1 on drift
+"""
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+from psycopg2 import sql
+
+ROLLUP_TABLE = "daily_sales_by_country"
+SOURCE_TABLE = "online_retail_data"
+
+# Sum of the positive line items of `{rows}`, grouped per country and day, ready to upsert
+ROLLUP_UPSERT = """
+    INSERT INTO {rollup} (country, day, sales, line_items)
+    SELECT "Country", "InvoiceDate"::date, SUM("Quantity" * "UnitPrice"), COUNT(*)
+    FROM {rows}
+    WHERE "Quantity" > 0 AND "UnitPrice" > 0 AND "Country" IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (country, day) DO UPDATE
+    SET sales = {rollup}.sales + EXCLUDED.sales,
+        line_items = {rollup}.line_items + EXCLUDED.line_items
+"""
+
+
+def create_rollup_table(cursor, rollup_table=ROLLUP_TABLE):
+    cursor.execute(sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {} (
+            country TEXT NOT NULL,
+            day DATE NOT NULL,
+            sales NUMERIC NOT NULL,
+            line_items BIGINT NOT NULL,
+            PRIMARY KEY (country, day)
+        )
+    """).format(sql.Identifier(rollup_table)))
+
+
+def rollup_upsert(rows, rollup_table=ROLLUP_TABLE):
+    """ROLLUP_UPSERT reading from `rows`, a table or CTE name holding newly inserted line items."""
+    return sql.SQL(ROLLUP_UPSERT).format(rollup=sql.Identifier(rollup_table), rows=sql.Identifier(rows))
+
+
+def rebuild_rollup(cursor):
+    """Recompute the whole rollup from the fact table; readers see the old contents until commit."""
+    create_rollup_table(cursor)
+    cursor.execute(sql.SQL("DELETE FROM {}").format(sql.Identifier(ROLLUP_TABLE)))
+    cursor.execute(rollup_upsert(SOURCE_TABLE))
+    return cursor.rowcount
+
+
+def verify_rollup(cursor, limit=20):
+    """(country, day, rollup sales, fact sales, rollup count, fact count) rows where the two disagree."""
+    cursor.execute(sql.SQL("""
+        WITH fact AS (
+            SELECT "Country" AS country, "InvoiceDate"::date AS day,
+                   SUM("Quantity" * "UnitPrice") AS sales, COUNT(*) AS line_items
+            FROM {source}
+            WHERE "Quantity" > 0 AND "UnitPrice" > 0 AND "Country" IS NOT NULL
+            GROUP BY 1, 2
+        )
+        SELECT COALESCE(r.country, f.country), COALESCE(r.day, f.day),
+               r.sales, f.sales, r.line_items, f.line_items
+        FROM {rollup} r
+        FULL OUTER JOIN fact f ON r.country = f.country AND r.day = f.day
+        WHERE r.sales IS DISTINCT FROM f.sales OR r.line_items IS DISTINCT FROM f.line_items
+        ORDER BY 1, 2
+        LIMIT %s
+    """).format(source=sql.Identifier(SOURCE_TABLE), rollup=sql.Identifier(ROLLUP_TABLE)), (limit,))
+    return cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f"Rebuild or verify {ROLLUP_TABLE}.")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        host=os.environ.get('POSTGRES_HOST', 'localhost'),
+        database=os.environ.get('POSTGRES_DB', 'your_database'),
+        user=os.environ.get('POSTGRES_USER', 'your_user'),
+        password=os.environ.get('POSTGRES_PASSWORD', 'your_password')
+    )
+    start = time.perf_counter()
+    try:
+        with conn.cursor() as cursor:
+            if args.command == "rebuild":
+                rows = rebuild_rollup(cursor)
+                conn.commit()
+                print(f"✅ Rebuilt `{ROLLUP_TABLE}` ({rows} rows) in {time.perf_counter() - start:.1f}s")
+                return 0
+
+            mismatches = verify_rollup(cursor)
+            conn.rollback()
+            if not mismatches:
+                print(f"✅ `{ROLLUP_TABLE}` matches `{SOURCE_TABLE}` ({time.perf_counter() - start:.1f}s)")
+                return 0
+            print(f"❌ `{ROLLUP_TABLE}` differs from `{SOURCE_TABLE}`; first mismatches:")
+            for country, day, rollup_sales, fact_sales, rollup_n, fact_n in mismatches:
+                print(f"  {country} {day}: sales {rollup_sales} vs {fact_sales}, line items {rollup_n} vs {fact_n}")
+            print("Run `python rollup.py rebuild` to recompute it.")
+            return 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,20 @@
 import json
+import numpy as np
+import pandas as pd
 import psycopg2
-from kafka import KafkaConsumer
 from psycopg2.extras import execute_values
+from kafka import KafkaConsumer, ConsumerRebalanceListener, OffsetAndMetadata, TopicPartition
+from kafka.errors import CommitFailedError
 import os
-from datetime import datetime
+import queue
+import threading
+import time
+from io import StringIO
+
+try:
+    import orjson
+except ImportError:  # plain json still works, just slower
+    orjson = None
 
 # PostgreSQL connection settings
 DB_HOST = os.environ.get('POSTGRES_HOST', 'localhost')
@@ -11,69 +22,606 @@ DB_NAME = os.environ.get('POSTGRES_DB', 'your_database')
 DB_USER = os.environ.get('POSTGRES_USER', 'your_user')
 DB_PASSWORD = os.environ.get('POSTGRES_PASSWORD', 'your_password')
 
-conn = psycopg2.connect(
-    host=DB_HOST,
-    database=DB_NAME,
-    user=DB_USER,
-    password=DB_PASSWORD,
-)
-cur = conn.cursor()
-
-# Kafka consumer setup
-consumer = KafkaConsumer(
-    'sales',
-    bootstrap_servers='localhost:9092',
-    group_id='sales-consumer-group',
-    value_deserializer=lambda x: json.loads(x.decode('utf-8')),
-    auto_offset_reset='earliest',
-    enable_auto_commit=True
-)
-
-# Buffer for batch inserts
-buffer = []
-buffer_size = 10
-
-def cast_row(d):
-    """Ensure the values match the expected PostgreSQL types."""
-    return (
-        str(d.get('InvoiceNo')),
-        str(d.get('StockCode')),
-        d.get('Description'),  # None is OK for TEXT
-        float(d.get('Quantity', 0)),
-        datetime.strptime(d['InvoiceDate'], "%d/%m/%Y %H:%M"),
-        float(d.get('UnitPrice', 0.0)),
-        float(d.get('CustomerID', 0)),  # numeric in DB
-        d.get('Country')
+# Kafka settings
+KAFKA_BOOTSTRAP_SERVERS = os.environ.get('KAFKA_BOOTSTRAP_SERVERS', 'localhost:9092')
+KAFKA_TOPIC = os.environ.get('KAFKA_TOPIC', 'sales')
+KAFKA_GROUP_ID = os.environ.get('KAFKA_GROUP_ID', 'sales-consumer-group')
+
+# A batch is flushed once it holds BATCH_MAX_ROWS messages or its oldest one has waited BATCH_MAX_MS
+BATCH_MAX_ROWS = int(os.environ.get('BATCH_MAX_ROWS', '5000'))
+BATCH_MAX_MS = int(os.environ.get('BATCH_MAX_MS', '500'))
+# Attempts per batch before the consumer gives up; uncommitted offsets are redelivered on restart
+FLUSH_RETRIES = int(os.environ.get('FLUSH_RETRIES', '5'))
+# Pipeline lanes: each has a decode thread and a writer thread with its own connection
+CONSUMER_LANES = int(os.environ.get('CONSUMER_LANES', '4'))
+# Batches each lane's decode and write queues hold before the partitions feeding it are paused
+QUEUE_BATCHES = int(os.environ.get('QUEUE_BATCHES', '4'))
+# Seconds between throughput / lag / backpressure reports
+REPORT_INTERVAL = float(os.environ.get('REPORT_INTERVAL', '10'))
+
+# kafka-python >= 2.1 added leader_epoch to OffsetAndMetadata
+OFFSET_EXTRA = (-1,) if 'leader_epoch' in OffsetAndMetadata._fields else ()
+
+FIELDS = ['InvoiceNo', 'StockCode', 'Description', 'Quantity', 'InvoiceDate', 'UnitPrice', 'CustomerID', 'Country']
+# Messages without these are rejected; missing numbers default to 0 as before
+REQUIRED_FIELDS = ['InvoiceNo', 'StockCode', 'InvoiceDate']
+DATE_FORMAT = "%d/%m/%Y %H:%M"
+TEXT_FIELDS = ['InvoiceNo', 'StockCode', 'Description', 'Country']
+# Quantity is an INTEGER column
+QUANTITY_RANGE = (-2 ** 31, 2 ** 31 - 1)
+COLUMNS = '"InvoiceNo", "StockCode", "Description", "Quantity", "InvoiceDate", "UnitPrice", "CustomerID", "Country"'
+
+# Messages that failed decoding or validation, kept with the reason instead of stopping the consumer
+CREATE_REJECTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS stream_rejects (
+        topic TEXT NOT NULL,
+        kafka_partition INTEGER NOT NULL,
+        kafka_offset BIGINT NOT NULL,
+        payload TEXT,
+        reason TEXT NOT NULL,
+        rejected_at TIMESTAMPTZ NOT NULL DEFAULT now()
     )
+"""
+INSERT_REJECTS = """
+    INSERT INTO stream_rejects (topic, kafka_partition, kafka_offset, payload, reason) VALUES %s
+"""
+# Session-local landing table for COPY; emptied by every commit
+CREATE_BATCH_TABLE = """
+    CREATE TEMP TABLE IF NOT EXISTS stream_batch (LIKE online_retail_data) ON COMMIT DELETE ROWS
+"""
+COPY_BATCH = f"""
+    COPY stream_batch ({COLUMNS}) FROM STDIN WITH (FORMAT csv, NULL '')
+"""
+# The daily rollup (see data_engineering/rollup.py) is updated in the same statement
+INSERT_BATCH = f"""
+    WITH inserted AS (
+        INSERT INTO online_retail_data ({COLUMNS})
+        SELECT {COLUMNS} FROM stream_batch
+        RETURNING "Country", "InvoiceDate", "Quantity", "UnitPrice"
+    )
+    INSERT INTO daily_sales_by_country (country, day, sales, line_items)
+    SELECT "Country", "InvoiceDate"::date, SUM("Quantity" * "UnitPrice"), COUNT(*)
+    FROM inserted
+    WHERE "Quantity" > 0 AND "UnitPrice" > 0 AND "Country" IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (country, day) DO UPDATE
+    SET sales = daily_sales_by_country.sales + EXCLUDED.sales,
+        line_items = daily_sales_by_country.line_items + EXCLUDED.line_items
+"""
+
 
-def flush_to_postgres(batch):
-    if not batch:
-        return
-    query = """
-        INSERT INTO online_retail_data (
-    "InvoiceNo", "StockCode", "Description", "Quantity",
-    "InvoiceDate", "UnitPrice", "CustomerID", "Country"
+def connect():
+    conn = psycopg2.connect(
+        host=DB_HOST,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
     )
-        VALUES %s
+    with conn.cursor() as cur:
+        cur.execute(CREATE_REJECTS_TABLE)
+        cur.execute(CREATE_BATCH_TABLE)
+    conn.commit()
+    return conn
+
+def loads(data):
+    """
+    orjson when installed, with json.loads as the rule: orjson rejects the NaN/Infinity
+    literals json accepts, so whatever it refuses gets a second try with json.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+def parse_payloads(messages):
+    """
+    JSON-decode a batch with one call on the joined payloads. If that fails, decode message
+    by message so a malformed payload only rejects itself. Returns (kept messages, values, rejects).
+    """
+    try:
+        values = loads(b"[" + b",".join(msg.value or b"" for msg in messages) + b"]")
+        if len(values) == len(messages):
+            return list(messages), values, []
+    except ValueError:
+        pass
+    kept, values, rejects = [], [], []
+    for msg in messages:
+        try:
+            values.append(loads(msg.value or b""))
+            kept.append(msg)
+        except ValueError as e:
+            rejects.append((msg, f"invalid JSON: {e}"))
+    return kept, values, rejects
+
+def decode_batch(messages):
+    """
+    Decode stage: raw Kafka messages -> (CSV text for COPY, rows, rejects).
+    The batch is converted column by column; messages that don't fit the schema become
+    (message, reason) rejects instead of failing the batch.
+    """
+    kept, values, rejects = parse_payloads(messages)
+    is_object = [isinstance(v, dict) for v in values]
+    rejects.extend((msg, "not a JSON object") for msg, ok in zip(kept, is_object) if not ok)
+    kept = [msg for msg, ok in zip(kept, is_object) if ok]
+    records = [v for v, ok in zip(values, is_object) if ok]
+    # object dtype keeps values as sent (no int -> float upcasts from a missing value elsewhere)
+    df = pd.DataFrame(records, columns=FIELDS, dtype=object)
+
+    # First problem found per row, '' when the row is valid
+    problems = np.full(len(df), '', dtype=object)
+
+    def flag(mask, reason):
+        problems[np.asarray(mask) & (problems == '')] = reason
+
+    for col in REQUIRED_FIELDS:
+        flag(df[col].isna(), f"missing {col}")
+    # Postgres TEXT can't hold NUL; COPY would fail the whole batch on it
+    for col in TEXT_FIELDS:
+        flag(df[col].astype(str).str.contains('\x00', regex=False), f"NUL in {col}")
+    dates = pd.to_datetime(df['InvoiceDate'], format=DATE_FORMAT, errors='coerce')
+    flag(dates.isna() & df['InvoiceDate'].notna(), "bad InvoiceDate")
+    numbers = {}
+    for col in ['Quantity', 'UnitPrice', 'CustomerID']:
+        parsed = pd.to_numeric(df[col], errors='coerce')
+        flag(parsed.isna() & df[col].notna(), f"bad {col}")
+        # A NaN literal looks like a missing value once in the frame, so look at the records
+        nan_literal = np.array([isinstance(r.get(col), float) and r[col] != r[col] for r in records], dtype=bool)
+        flag(np.isinf(parsed.astype(float)) | nan_literal, f"non-finite {col}")
+        numbers[col] = parsed.fillna(0).astype(float)
+    quantity = np.rint(numbers['Quantity'])
+    flag((quantity < QUANTITY_RANGE[0]) | (quantity > QUANTITY_RANGE[1]), "Quantity out of range")
+
+    valid = problems == ''
+    rejects.extend((kept[i], problems[i]) for i in np.flatnonzero(~valid))
+    rows = pd.DataFrame({
+        'InvoiceNo': df['InvoiceNo'][valid].astype(str),
+        'StockCode': df['StockCode'][valid].astype(str),
+        'Description': df['Description'][valid],
+        # INTEGER column; rint rounds like Postgres' float8 -> int cast
+        'Quantity': quantity[valid].astype(np.int64),
+        'InvoiceDate': dates[valid],
+        'UnitPrice': numbers['UnitPrice'][valid],
+        'CustomerID': numbers['CustomerID'][valid],
+        'Country': df['Country'][valid],
+    })
+    payload = rows.to_csv(index=False, header=False, date_format='%Y-%m-%d %H:%M:%S')
+    return payload, len(rows), rejects
+
+def decode_isolated(messages):
+    """Slow path for a batch that trips the vectorized decoder: decode message by message."""
+    payloads, rows, rejects = [], 0, []
+    for msg in messages:
+        try:
+            payload, count, bad = decode_batch([msg])
+        except Exception as e:
+            rejects.append((msg, f"undecodable: {e}"))
+            continue
+        payloads.append(payload)
+        rows += count
+        rejects.extend(bad)
+    return "".join(payloads), rows, rejects
+
+def pg_text(text):
+    """Postgres TEXT can't hold NUL (psycopg2 raises before sending); keep it visible as an escape."""
+    return text.replace('\x00', '\\x00')
+
+def reject_rows(rejects):
+    return [
+        (msg.topic, msg.partition, msg.offset,
+         pg_text((msg.value or b"").decode('utf-8', errors='replace')), pg_text(reason))
+        for msg, reason in rejects
+    ]
+
+def write_isolating(cur, messages, rejects):
+    """
+    Insert `messages` after Postgres refused them as one batch. They are re-decoded and
+    written under a savepoint; on a data error the set is halved until each refused
+    row is alone, and those rows join `rejects`. Returns the number of rows inserted.
     """
-    values = [cast_row(d) for d in batch]
-    for row in values:
-        print("🔄 Inserting row:", row)
+    payload, rows, bad = decode_isolated(messages)
+    cur.execute("SAVEPOINT isolate")
+    try:
+        if rows:
+            # Rows of an earlier half are still in the temp table until commit
+            cur.execute("TRUNCATE stream_batch")
+            cur.copy_expert(COPY_BATCH, StringIO(payload))
+            cur.execute(INSERT_BATCH)
+    except psycopg2.DataError as e:
+        cur.execute("ROLLBACK TO SAVEPOINT isolate")
+        cur.execute("RELEASE SAVEPOINT isolate")
+        if len(messages) == 1:
+            rejects.append((messages[0], f"refused by Postgres: {e}".strip()))
+            return 0
+        middle = len(messages) // 2
+        return write_isolating(cur, messages[:middle], rejects) + write_isolating(cur, messages[middle:], rejects)
+    cur.execute("RELEASE SAVEPOINT isolate")
+    rejects.extend(bad)
+    return rows
 
-    execute_values(cur, query, values)
+def flush_to_postgres(conn, batch):
+    """
+    COPY the batch into the temp table, then insert it, update the rollup and
+    record its rejects in one transaction. A batch with rows Postgres refuses
+    (a data error would fail every retry too) is written again with those rows isolated.
+    """
+    if not batch.isolate:
+        try:
+            with conn.cursor() as cur:
+                if batch.rows:
+                    cur.copy_expert(COPY_BATCH, StringIO(batch.payload))
+                    cur.execute(INSERT_BATCH)
+                if batch.rejects:
+                    execute_values(cur, INSERT_REJECTS, reject_rows(batch.rejects))
+            conn.commit()
+            return
+        except psycopg2.DataError as e:
+            conn.rollback()
+            print(f"⚠️ Postgres refused rows of a {len(batch.messages)}-message batch ({e}), isolating them")
+            batch.isolate = True
+
+    with conn.cursor() as cur:
+        rejects = []
+        rows = write_isolating(cur, batch.messages, rejects)
+        if rejects:
+            execute_values(cur, INSERT_REJECTS, reject_rows(rejects))
     conn.commit()
-    print(f"✅ Inserted {len(values)} rows into stream_data.\n")
+    batch.rows, batch.rejects = rows, rejects
 
-# Start consuming
-try:
-    for msg in consumer:
-        buffer.append(msg.value)
-        if len(buffer) >= buffer_size:
-            flush_to_postgres(buffer)
-            buffer = []
-except KeyboardInterrupt:
-    print("⛔ Stopped by user.")
-finally:
-    flush_to_postgres(buffer)
-    cur.close()
-    conn.close()
+def flush_with_retry(conn, batch):
+    """Flush, retrying with backoff (and a fresh connection if it broke). Returns the connection to keep using."""
+    for attempt in range(1, FLUSH_RETRIES + 1):
+        try:
+            flush_to_postgres(conn, batch)
+            return conn
+        except psycopg2.Error as e:
+            if attempt == FLUSH_RETRIES:
+                raise
+            print(f"⚠️ Flush of {len(batch.messages)} messages failed ({e}), retry {attempt}/{FLUSH_RETRIES - 1}")
+            time.sleep(min(0.5 * 2 ** attempt, 30))
+            if conn.closed:
+                conn = connect()
+            else:
+                conn.rollback()
+    return conn
+
+
+class ThroughputReport:
+    """Rows/s and end-to-end lag (Kafka record timestamp -> DB commit) per reporting window."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset(time.monotonic())
+
+    def reset(self, now):
+        self.window_start = now
+        self.rows = 0
+        self.flushes = 0
+        self.rejected = 0
+        self.lags_ms = []
+
+    def record(self, messages, rejected=0):
+        committed_ms = time.time() * 1000
+        with self.lock:
+            self.rows += len(messages)
+            self.rejected += rejected
+            self.flushes += 1
+            self.lags_ms.extend(committed_ms - msg.timestamp for msg in messages)
+
+    def report(self, now):
+        with self.lock:
+            elapsed = now - self.window_start
+            if self.lags_ms:
+                lags = sorted(self.lags_ms)
+                p50 = lags[int(0.50 * (len(lags) - 1))]
+                p99 = lags[int(0.99 * (len(lags) - 1))]
+                print(f"📈 {self.rows} rows in {self.flushes} flushes over {elapsed:.1f}s "
+                      f"({self.rows / elapsed:,.0f} rows/s, {self.rejected} rejected), "
+                      f"lag p50 {p50:.0f} ms, p99 {p99:.0f} ms")
+            self.reset(now)
+
+
+class StageStats:
+    """
+    Backpressure view of one pipeline stage, summed over its lanes: time spent working,
+    waiting for input (idle) and waiting for room downstream (blocked).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.batches = 0
+        self.busy = 0.0
+        self.idle = 0.0
+        self.blocked = 0.0
+
+    def add(self, busy=0.0, idle=0.0, blocked=0.0, batches=0):
+        with self.lock:
+            self.busy += busy
+            self.idle += idle
+            self.blocked += blocked
+            self.batches += batches
+
+    def snapshot(self):
+        with self.lock:
+            stats = {"batches": self.batches, "busy": self.busy, "idle": self.idle, "blocked": self.blocked}
+            self.reset()
+        return stats
+
+
+class Batch:
+    """Messages of one lane, and the offset to commit per partition once they are written."""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.offsets = {}
+        for msg in messages:
+            self.offsets[TopicPartition(msg.topic, msg.partition)] = msg.offset + 1
+        self.payload = None
+        self.rows = 0
+        self.rejects = []
+        # Set once Postgres refused some of its rows; later attempts write it row-isolated
+        self.isolate = False
+
+
+class Lane:
+    """
+    A decode thread and a writer thread (with its own connection) joined by bounded queues.
+    Every partition is routed to exactly one lane, so its rows are written in order.
+    """
+
+    def __init__(self, index, pipeline):
+        self.index = index
+        self.pipeline = pipeline
+        self.decode_queue = queue.Queue(maxsize=QUEUE_BATCHES)
+        self.write_queue = queue.Queue(maxsize=QUEUE_BATCHES)
+        self.conn = connect()
+        # Poll-thread state: messages gathering towards the next batch, and a batch
+        # the decode queue had no room for (its partitions are paused meanwhile)
+        self.messages = []
+        self.deadline = None
+        self.waiting = None
+        self.threads = [
+            threading.Thread(target=self.decode_loop, name=f"decode-{index}", daemon=True),
+            threading.Thread(target=self.write_loop, name=f"write-{index}", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def decode_loop(self):
+        stats = self.pipeline.stats["decode"]
+        while True:
+            start = time.monotonic()
+            batch = self.decode_queue.get()
+            got = time.monotonic()
+            if batch is None:
+                self.write_queue.put(None)
+                return
+            if not self.pipeline.failed.is_set():
+                try:
+                    batch.payload, batch.rows, batch.rejects = decode_batch(batch.messages)
+                except Exception:
+                    batch.payload, batch.rows, batch.rejects = decode_isolated(batch.messages)
+            decoded = time.monotonic()
+            self.write_queue.put(batch)
+            stats.add(idle=got - start, busy=decoded - got, blocked=time.monotonic() - decoded, batches=1)
+
+    def write_loop(self):
+        stats = self.pipeline.stats["write"]
+        while True:
+            start = time.monotonic()
+            batch = self.write_queue.get()
+            got = time.monotonic()
+            if batch is None:
+                return
+            # After a failure batches are only drained, never written or committed
+            if not self.pipeline.failed.is_set():
+                try:
+                    self.conn = flush_with_retry(self.conn, batch)
+                    self.pipeline.done.put(batch.offsets)
+                    self.pipeline.report.record(batch.messages, len(batch.rejects))
+                except Exception as e:
+                    self.pipeline.fail(e)
+            self.pipeline.finish_batch()
+            stats.add(idle=got - start, busy=time.monotonic() - got, batches=1)
+
+    def close(self):
+        self.decode_queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.conn.close()
+
+
+class Pipeline:
+    """
+    poll (this thread) -> decode (one thread per lane) -> write (one thread and connection per lane).
+    The poll thread owns the KafkaConsumer: it routes partitions to lanes, pauses partitions
+    whose lane is full, and commits the offsets of batches the writers have finished.
+    """
+
+    def __init__(self, consumer, lanes=CONSUMER_LANES):
+        self.consumer = consumer
+        self.failed = threading.Event()
+        self.error = None
+        self.done = queue.Queue()
+        self.report = ThroughputReport()
+        self.stats = {"poll": StageStats("poll"), "decode": StageStats("decode"), "write": StageStats("write")}
+        self.in_flight = 0
+        self.in_flight_changed = threading.Condition()
+        self.paused = set()
+        self.pauses = 0
+        self.committed = {}
+        self.lanes = [Lane(i, self) for i in range(max(lanes, 1))]
+
+    def fail(self, error):
+        if self.error is None:
+            self.error = error
+        self.failed.set()
+
+    def finish_batch(self):
+        with self.in_flight_changed:
+            self.in_flight -= 1
+            self.in_flight_changed.notify_all()
+
+    def lane_for(self, tp):
+        return self.lanes[tp.partition % len(self.lanes)]
+
+    def add(self, polled):
+        for tp, messages in polled.items():
+            lane = self.lane_for(tp)
+            if not lane.messages:
+                lane.deadline = time.monotonic() + BATCH_MAX_MS / 1000
+            lane.messages.extend(messages)
+
+    def submit_ready(self, force=False):
+        """Hand full or expired lane buffers to their decode queues without blocking the poll loop."""
+        now = time.monotonic()
+        for lane in self.lanes:
+            if lane.waiting is None and lane.messages and (
+                    force or len(lane.messages) >= BATCH_MAX_ROWS or now >= lane.deadline):
+                lane.waiting = Batch(lane.messages)
+                lane.messages = []
+                lane.deadline = None
+            if lane.waiting is None:
+                continue
+            with self.in_flight_changed:
+                self.in_flight += 1
+            try:
+                lane.decode_queue.put_nowait(lane.waiting)
+                lane.waiting = None
+            except queue.Full:
+                self.finish_batch()
+        self.update_pauses()
+
+    def update_pauses(self):
+        """Pause the partitions of lanes that are holding a batch back, resume the others."""
+        blocked = [tp for tp in self.consumer.assignment() if self.lane_for(tp).waiting is not None]
+        pause = set(blocked) - self.paused
+        resume = self.paused - set(blocked)
+        if pause:
+            self.consumer.pause(*pause)
+            self.pauses += 1
+        if resume:
+            self.consumer.resume(*resume)
+        self.paused = set(blocked)
+
+    def poll_timeout_ms(self):
+        deadlines = [lane.deadline for lane in self.lanes if lane.deadline is not None]
+        if any(lane.waiting is not None for lane in self.lanes):
+            return 50
+        if not deadlines:
+            return BATCH_MAX_MS
+        return int(max(0, (min(deadlines) - time.monotonic()) * 1000))
+
+    def commit_done(self):
+        """Commit the offsets of every batch written so far (called on the poll thread only)."""
+        offsets = {}
+        while True:
+            try:
+                offsets.update(self.done.get_nowait())
+            except queue.Empty:
+                break
+        if not offsets:
+            return
+        try:
+            self.consumer.commit({tp: OffsetAndMetadata(offset, '', *OFFSET_EXTRA) for tp, offset in offsets.items()})
+            self.committed.update(offsets)
+        except CommitFailedError as e:
+            # Partitions were reassigned; their new owner will redeliver from the last committed offset
+            print(f"⚠️ Offset commit failed ({e})")
+
+    def drain(self):
+        """Write out everything buffered or in flight and commit it, e.g. before partitions are revoked."""
+        while True:
+            self.submit_ready(force=True)
+            with self.in_flight_changed:
+                if self.in_flight == 0 and all(lane.waiting is None and not lane.messages for lane in self.lanes):
+                    break
+                self.in_flight_changed.wait(timeout=0.05)
+            if self.failed.is_set():
+                break
+        self.commit_done()
+
+    def report_stats(self, now, window):
+        self.report.report(now)
+        stats = {name: stage.snapshot() for name, stage in self.stats.items()}
+        lanes = len(self.lanes)
+        poll = stats["poll"]
+        parts = [f"poll busy {poll['busy'] / window:.0%}, paused {len(self.paused)} partitions ({self.pauses} pauses)"]
+        for name, queue_attr in (("decode", "decode_queue"), ("write", "write_queue")):
+            stage = stats[name]
+            depth = sum(getattr(lane, queue_attr).qsize() for lane in self.lanes)
+            parts.append(f"{name} busy {stage['busy'] / (window * lanes):.0%}, "
+                         f"blocked {stage['blocked'] / (window * lanes):.0%}, queue {depth}/{QUEUE_BATCHES * lanes}")
+        print("📊 " + " | ".join(parts))
+        self.pauses = 0
+
+    def close(self):
+        for lane in self.lanes:
+            lane.close()
+
+
+class DrainOnRevoke(ConsumerRebalanceListener):
+    """Flush and commit what this consumer holds before its partitions move elsewhere."""
+
+    def __init__(self):
+        self.pipeline = None
+
+    def on_partitions_revoked(self, revoked):
+        if self.pipeline is not None:
+            self.pipeline.drain()
+            self.pipeline.paused -= set(revoked)
+
+    def on_partitions_assigned(self, assigned):
+        pass
+
+
+def main():
+    # Offsets are committed by hand, after the rows are in Postgres
+    consumer = KafkaConsumer(
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=KAFKA_GROUP_ID,
+        # Values stay raw bytes: the decode stage parses whole batches at once
+        auto_offset_reset='earliest',
+        enable_auto_commit=False,
+        max_poll_records=BATCH_MAX_ROWS
+    )
+    listener = DrainOnRevoke()
+    consumer.subscribe([KAFKA_TOPIC], listener=listener)
+    pipeline = Pipeline(consumer)
+    listener.pipeline = pipeline
+    print(f"🚀 Consuming `{KAFKA_TOPIC}` over {len(pipeline.lanes)} lanes")
+
+    window_start = time.monotonic()
+    try:
+        while not pipeline.failed.is_set():
+            start = time.monotonic()
+            polled = consumer.poll(timeout_ms=pipeline.poll_timeout_ms())
+            polled_at = time.monotonic()
+            pipeline.add(polled)
+            pipeline.submit_ready()
+            pipeline.commit_done()
+            pipeline.stats["poll"].add(busy=time.monotonic() - polled_at, idle=polled_at - start)
+
+            now = time.monotonic()
+            if now - window_start >= REPORT_INTERVAL:
+                pipeline.report_stats(now, now - window_start)
+                window_start = now
+        raise pipeline.error
+    except KeyboardInterrupt:
+        print("⛔ Stopped by user.")
+    finally:
+        if not pipeline.failed.is_set():
+            pipeline.drain()
+        pipeline.close()
+        # After a failure, still commit what was written before it
+        pipeline.commit_done()
+        consumer.close(autocommit=False)
+
+
+if __name__ == "__main__":
+    main()
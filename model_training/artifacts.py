@@ -0,0 +1,70 @@
+"""
+Compact model artifacts: the fitted parameters of a model without the pickled object.
+
+An artifact is two files next to each other in the model directory:
+  <stem>.json            metadata (engine, scaling, seasonalities) and where each array lives
+  <stem>.<digest>.npy    all arrays packed into one float64 vector, memory-mappable
+
+The .npy name carries a content digest and the .json is replaced last, so readers
+always see a consistent pair. The API loads these with np.load(mmap_mode='r'),
+which lets every worker on a node share the same pages.
+"""
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+ARTIFACT_FORMAT = "forecast-params/1"
+ARRAY_FIELDS = ("changepoints_t", "delta", "beta")
+
+
+def _replace_atomically(path, write):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def save_params(params, stem, model_version=None):
+    """
+    Write `params` as <stem>.json + <stem>.<digest>.npy.
+    Returns (json path, model version); the version defaults to the content digest.
+    """
+    meta = {k: v for k, v in params.items() if k not in ARRAY_FIELDS}
+    arrays = [np.asarray(params[name], dtype=np.float64).ravel() for name in ARRAY_FIELDS]
+    packed = np.concatenate(arrays)
+    digest = hashlib.sha256(packed.tobytes() + json.dumps(meta, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    npy_path = f"{stem}.{digest}.npy"
+    _replace_atomically(npy_path, lambda f: np.save(f, packed))
+
+    layout = {"file": os.path.basename(npy_path)}
+    offset = 0
+    for name, array in zip(ARRAY_FIELDS, arrays):
+        layout[name] = [offset, len(array)]
+        offset += len(array)
+    model_version = model_version or digest
+    meta.update({"format": ARTIFACT_FORMAT, "model_version": model_version, "arrays": layout})
+
+    json_path = f"{stem}.json"
+    _replace_atomically(json_path, lambda f: f.write(json.dumps(meta, indent=2).encode("utf-8")))
+
+    # Older array files are no longer referenced; readers that still map them keep their pages
+    for old in glob.glob(f"{glob.escape(stem)}.*.npy"):
+        if old != npy_path:
+            os.remove(old)
+    return json_path, model_version
+
+
+def remove_params(stem):
+    """
+    Delete the artifact at `stem`, if any. Used when a fit is saved only as a pickle,
+    so the API doesn't keep serving an older fit from a stale .json.
+    """
+    for path in [f"{stem}.json"] + glob.glob(f"{glob.escape(stem)}.*.npy"):
+        if os.path.exists(path):
+            os.remove(path)
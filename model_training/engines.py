@@ -0,0 +1,147 @@
+"""
+Forecasting engines behind one interface, selected by name.
+
+    engine = ENGINES["fourier"]
+    models = engine.fit_many({country: daily_df, ...}, freq="D")
+    model = engine.fit(daily_df, freq="D")
+    yhat = engine.predict(models[country], dates)
+    params = engine.to_params(models[country])   # compact artifact, see artifacts.py
+
+"prophet" fits one Stan model per series. "fourier" fits every series at once:
+a piecewise-linear trend plus Fourier seasonalities solved as one batched ridge
+regression in NumPy. Its parameters use Prophet's layout (k, m, delta, beta,
+changepoints_t, seasonalities), so both engines are evaluated by the API's point_forecast.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from prophet import Prophet
+
+# The API's evaluator (api_development/model_params.py): artifacts are written and
+# backtests are scored with the exact code that serves them
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api_development"))
+from model_params import SECONDS_PER_DAY, fourier_features, point_forecast, prophet_params  # noqa: E402
+
+
+def _seconds(dates):
+    return pd.DatetimeIndex(dates).values.astype('datetime64[ns]').astype(np.int64) / 1e9
+
+
+class ProphetEngine:
+    name = "prophet"
+    # One Stan fit per series, so the trainer spreads series across processes
+    batched = False
+
+    def fit_many(self, series, freq="D", init=None):
+        init = init or {}
+        return {key: self.fit(daily, freq, init.get(key)) for key, daily in series.items()}
+
+    def fit(self, daily, freq="D", init=None):
+        if init is not None:
+            return Prophet().fit(daily[['ds', 'y']], init=init)
+        return Prophet().fit(daily[['ds', 'y']])
+
+    def predict(self, model, dates):
+        return model.predict(pd.DataFrame({'ds': dates}))['yhat'].to_numpy()
+
+    def to_params(self, model):
+        return prophet_params(model)
+
+
+class FourierEngine:
+    """
+    Trend + Fourier seasonality by batched ridge least squares.
+    All series share one date grid and design matrix; each series only weighs the
+    days inside its own history, and the per-series normal equations are solved in one call.
+    """
+    name = "fourier"
+    batched = True
+    n_changepoints = 10
+    changepoint_range = 0.8
+    ridge_delta = 1.0
+    ridge_seasonal = 0.1
+
+    def seasonalities(self, freq, span_days):
+        # Same spirit as Prophet's 'auto': yearly needs two years of history, weekly needs daily data
+        seasonalities = []
+        if span_days >= 730:
+            seasonalities.append({'name': 'yearly', 'period': 365.25, 'fourier_order': 10 if freq == "D" else 5})
+        if freq == "D":
+            seasonalities.append({'name': 'weekly', 'period': 7.0, 'fourier_order': 3})
+        return seasonalities
+
+    def fit_many(self, series, freq="D", init=None):
+        keys = list(series)
+        if not keys:
+            return {}
+        grid = pd.DatetimeIndex(sorted(set().union(*(set(series[k]['ds']) for k in keys))))
+        secs = _seconds(grid)
+        start, t_scale = secs[0], max(secs[-1] - secs[0], SECONDS_PER_DAY)
+        t = (secs - start) / t_scale
+
+        # Observations per series on the shared grid; mask marks each series' own history
+        Y = np.zeros((len(grid), len(keys)))
+        mask = np.zeros_like(Y)
+        for j, key in enumerate(keys):
+            rows = grid.get_indexer(pd.DatetimeIndex(series[key]['ds']))
+            Y[rows, j] = series[key]['y'].to_numpy(dtype=float)
+            mask[rows, j] = 1.0
+        y_scale = np.abs(Y).max(axis=0)
+        y_scale[y_scale == 0] = 1.0
+        Y = Y / y_scale
+
+        changepoints_t = np.linspace(0, self.changepoint_range, self.n_changepoints + 1)[1:]
+        seasonalities = self.seasonalities(freq, (secs[-1] - secs[0]) / SECONDS_PER_DAY)
+        blocks = [np.ones((len(t), 1)), t[:, None], np.maximum(t[:, None] - changepoints_t[None, :], 0)]
+        col = 0
+        for s in seasonalities:
+            s.update({'mode': 'additive', 'col': col})
+            blocks.append(fourier_features(secs / SECONDS_PER_DAY, s['period'], s['fourier_order']))
+            col += 2 * s['fourier_order']
+        X = np.hstack(blocks)
+
+        n_trend = 2 + self.n_changepoints
+        ridge = np.full(X.shape[1], 1e-8)
+        ridge[2:n_trend] = self.ridge_delta
+        ridge[n_trend:] = self.ridge_seasonal
+
+        # Batched normal equations: (X' W_j X + R) b_j = X' W_j y_j for every series j at once
+        gram = np.einsum('tj,tp,tq->jpq', mask, X, X, optimize=True) + np.diag(ridge)
+        rhs = np.einsum('tj,tp,tj->jp', mask, X, Y, optimize=True)
+        coef = np.linalg.solve(gram, rhs[..., None])[..., 0]
+        residuals = (Y - X @ coef.T) * mask
+        sigma = np.sqrt((residuals ** 2).sum(axis=0) / np.maximum(mask.sum(axis=0), 1))
+
+        models = {}
+        for j, key in enumerate(keys):
+            models[key] = {
+                'engine': self.name,
+                'growth': 'linear',
+                'start': float(start),
+                't_scale': float(t_scale),
+                'y_scale': float(y_scale[j]),
+                'floor': 0.0,
+                'last_ds': float(_seconds(series[key]['ds']).max()),
+                'changepoints_t': changepoints_t,
+                'm': float(coef[j, 0]),
+                'k': float(coef[j, 1]),
+                'delta': coef[j, 2:n_trend],
+                'beta': coef[j, n_trend:],
+                'sigma_obs': float(sigma[j]),
+                'seasonalities': [dict(s) for s in seasonalities],
+            }
+        return models
+
+    def fit(self, daily, freq="D", init=None):
+        return self.fit_many({0: daily}, freq)[0]
+
+    def predict(self, model, dates):
+        return point_forecast(model, dates)
+
+    def to_params(self, model):
+        return model
+
+
+ENGINES = {engine.name: engine for engine in (ProphetEngine(), FourierEngine())}
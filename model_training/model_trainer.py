@@ -1,8 +1,17 @@
 import pandas as pd
-from prophet import Prophet
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
 import joblib
+import hashlib
+import json
+import logging
 import os
+import time
+import numpy as np
+from artifacts import save_params, remove_params
+from engines import ENGINES
 
 # --- CONFIGURE DATABASE ---
 DB_HOST = os.environ.get('POSTGRES_HOST', 'localhost')
@@ -11,38 +20,380 @@ DB_NAME = os.environ.get('POSTGRES_DB', 'your_database')
 DB_USER = os.environ.get('POSTGRES_USER', 'your_user')
 DB_PASS  = os.environ.get('POSTGRES_PASSWORD', 'your_password')
 TABLE_NAME = "online_retail_data"
+# Daily sales per country, maintained by the loader and the Kafka consumer
+ROLLUP_TABLE = "daily_sales_by_country"
+DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+MODEL_DIR = os.environ.get('MODEL_DIR', '../models')
+# Prophet needs at least two non-NaN rows; tiny series make poor models anyway
+MIN_TRAINING_DAYS = 30
+# Line items per chunk when the source can't aggregate for us
+CHUNK_ROWS = 100_000
+FORECAST_TABLE = "forecast_results"
+# How far ahead forecasts are precomputed for the API, per frequency
+MATERIALIZE_HORIZONS = {"D": 365, "M": 60, "Y": 60}
+# "pickle" (joblib Prophet object), "params" (compact .json + .npy artifact) or "both"
+MODEL_FORMAT = os.environ.get('MODEL_FORMAT', 'both')
+# Per-country data fingerprints of the last successful run, kept next to the models
+STATE_FILE = "training_state.json"
 
-# --- CONNECT TO DATABASE ---
-engine = create_engine(f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
-query = f'''
-    SELECT "InvoiceDate", "Quantity", "UnitPrice", "Country"
-    FROM {TABLE_NAME}
-    WHERE "Quantity" > 0 AND "UnitPrice" > 0
-'''
-df = pd.read_sql_query(query, engine)
 
-# --- CLEAN & TRANSFORM ---
-df['InvoiceDate'] = pd.to_datetime(df['InvoiceDate'])
-df['SaleAmount'] = df['Quantity'] * df['UnitPrice']
+def file_digest(path):
+    """Content hash of a model file; the API uses the same digest to match precomputed rows."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
 
-# Example: train for a specific country, e.g., United Kingdom
-country = "United Kingdom"
-country_df = df[df['Country'] == country]
 
-# Aggregate by day
-daily = country_df.groupby(pd.Grouper(key='InvoiceDate', freq='D'))['SaleAmount'].sum().reset_index()
-daily.columns = ['ds', 'y']
+def create_forecast_table(engine):
+    """
+    Create FORECAST_TABLE once, before the workers start: concurrent CREATE TABLE IF NOT EXISTS
+    can still collide in Postgres (unique violation on pg_type). The advisory lock covers
+    two training runs starting at the same time.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:table))"), {"table": FORECAST_TABLE})
+        conn.execute(text(f'''
+            CREATE TABLE IF NOT EXISTS {FORECAST_TABLE} (
+                country TEXT NOT NULL,
+                freq TEXT NOT NULL,
+                step INTEGER NOT NULL,
+                ds TIMESTAMP NOT NULL,
+                yhat DOUBLE PRECISION NOT NULL,
+                model_version TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL DEFAULT now(),
+                PRIMARY KEY (country, freq, step)
+            )
+        '''))
 
-# Drop NaNs (Prophet requirement)
-daily.dropna(inplace=True)
 
-# --- TRAIN MODEL ---
-model = Prophet()
-model.fit(daily)
+def materialize_forecasts(engine, model, country, model_version):
+    """Replace the precomputed forecasts of `country` with ones from the freshly trained model."""
+    rows = []
+    for freq, horizon in MATERIALIZE_HORIZONS.items():
+        future = model.make_future_dataframe(periods=horizon, freq=freq, include_history=False)
+        forecast = model.predict(future)
+        for step, (ds, yhat) in enumerate(zip(forecast['ds'], forecast['yhat']), start=1):
+            rows.append({"country": country, "freq": freq, "step": step,
+                         "ds": ds.to_pydatetime(), "yhat": float(yhat), "model_version": model_version})
 
-# --- SAVE MODEL ---
-os.makedirs("../models", exist_ok=True)
-model_path = f"../models/prophet_model_{country.replace(' ', '_')}.pkl"
-joblib.dump(model, model_path)
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {FORECAST_TABLE} WHERE country = :country"), {"country": country})
+        conn.execute(text(f'''
+            INSERT INTO {FORECAST_TABLE} (country, freq, step, ds, yhat, model_version)
+            VALUES (:country, :freq, :step, :ds, :yhat, :model_version)
+        '''), rows)
+    return len(rows)
 
-print(f"✅ Model for {country} trained and saved to {model_path}")
+
+def load_daily_sales(engine):
+    """
+    Daily sales per country: {country: DataFrame(ds, y)}.
+    Read from the daily rollup when it has rows. Otherwise Postgres aggregates the raw
+    line items, and if that query fails too they are streamed and aggregated chunk by chunk.
+    """
+    rollup_query = f'''
+        SELECT country AS "Country", day::timestamp AS ds, sales::float8 AS y, line_items AS n
+        FROM {ROLLUP_TABLE}
+    '''
+    query = f'''
+        SELECT "Country", date_trunc('day', "InvoiceDate") AS ds,
+               SUM("Quantity" * "UnitPrice")::float8 AS y, COUNT(*) AS n
+        FROM {TABLE_NAME}
+        WHERE "Quantity" > 0 AND "UnitPrice" > 0
+        GROUP BY 1, 2
+    '''
+    daily = None
+    try:
+        daily = pd.read_sql_query(rollup_query, engine)
+    except Exception as e:
+        print(f"⚠️ Reading {ROLLUP_TABLE} failed ({e}), aggregating line items instead")
+    if daily is None or daily.empty:
+        try:
+            daily = pd.read_sql_query(query, engine)
+        except Exception as e:
+            print(f"⚠️ Server-side aggregation failed ({e}), falling back to a chunked read")
+            daily = aggregate_chunks(read_line_items_chunked(engine))
+    return split_by_country(daily)
+
+
+def read_line_items_chunked(engine, chunksize=CHUNK_ROWS):
+    """Stream raw line items with a server-side cursor instead of materializing the table."""
+    query = f'''
+        SELECT "InvoiceDate", "Quantity", "UnitPrice", "Country"
+        FROM {TABLE_NAME}
+        WHERE "Quantity" > 0 AND "UnitPrice" > 0
+    '''
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql_query(text(query), conn, chunksize=chunksize):
+            yield chunk
+
+
+def read_line_items_csv(path, chunksize=CHUNK_ROWS):
+    """Stream raw line items from a CSV export, for sources that can't aggregate."""
+    columns = ["InvoiceDate", "Quantity", "UnitPrice", "Country"]
+    for chunk in pd.read_csv(path, usecols=columns, chunksize=chunksize):
+        yield chunk[(chunk['Quantity'] > 0) & (chunk['UnitPrice'] > 0)]
+
+
+def aggregate_chunks(chunks):
+    """
+    Fold line-item chunks into (Country, ds, y, n) daily totals.
+    Memory is bounded by countries x days plus one chunk, not by the number of line items.
+    """
+    totals = None
+    for chunk in chunks:
+        day = pd.to_datetime(chunk['InvoiceDate']).dt.floor('D')
+        sales = pd.DataFrame({'y': (chunk['Quantity'] * chunk['UnitPrice']).astype(float), 'n': 1})
+        partial = sales.groupby([chunk['Country'], day]).sum()
+        totals = partial if totals is None else totals.add(partial, fill_value=0)
+    if totals is None:
+        return pd.DataFrame(columns=["Country", "ds", "y", "n"])
+    totals.index.names = ["Country", "ds"]
+    return totals.reset_index()
+
+
+def split_by_country(daily):
+    """One continuous daily series per country; days without sales are 0, as with pd.Grouper."""
+    daily['ds'] = pd.to_datetime(daily['ds'])
+    series = {}
+    for country, country_df in daily.groupby('Country'):
+        country_df = country_df.set_index('ds')[['y', 'n']].sort_index()
+        days = pd.date_range(country_df.index.min(), country_df.index.max(), freq='D')
+        series[country] = country_df.reindex(days, fill_value=0).rename_axis('ds').reset_index()
+    return series
+
+
+def fingerprint(daily):
+    """Watermark of one country's data: last day, line-item count and a hash of the daily totals."""
+    digest = hashlib.sha256()
+    digest.update(daily['ds'].values.astype('datetime64[D]').astype(np.int64).tobytes())
+    digest.update(np.round(daily['y'].to_numpy(dtype=float), 2).tobytes())
+    return {
+        "last_day": daily['ds'].max().strftime('%Y-%m-%d'),
+        "line_items": int(daily['n'].sum()),
+        "digest": digest.hexdigest()[:16],
+    }
+
+
+def load_state(model_dir):
+    path = os.path.join(model_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, model_dir):
+    path = os.path.join(model_dir, STATE_FILE)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def warm_start_params(stem):
+    """
+    Fitted parameters of the previous model for `stem`, in the form Prophet.fit(init=...) takes,
+    read from the pickle or else the parameter artifact. None when there is no previous model.
+    """
+    if os.path.exists(f"{stem}.pkl"):
+        params = joblib.load(f"{stem}.pkl").params
+        init = {name: float(np.nanmean(params[name])) for name in ('k', 'm', 'sigma_obs')}
+        init.update({name: np.nanmean(params[name], axis=0) for name in ('delta', 'beta')})
+        return init
+    if os.path.exists(f"{stem}.json"):
+        with open(f"{stem}.json") as f:
+            meta = json.load(f)
+        if 'sigma_obs' not in meta:
+            return None
+        packed = np.load(os.path.join(os.path.dirname(stem), meta['arrays']['file']))
+        init = {name: meta[name] for name in ('k', 'm', 'sigma_obs')}
+        for name in ('delta', 'beta'):
+            offset, length = meta['arrays'][name]
+            init[name] = packed[offset:offset + length]
+        return init
+    return None
+
+
+def model_stem(country, model_dir=MODEL_DIR, engine="prophet"):
+    return os.path.join(model_dir, f"{engine}_model_{country.replace(' ', '_')}")
+
+
+def save_pickle(model, path):
+    """joblib.dump through a temp file so the API never unpickles a half-written model."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def train_group(engine_name, series, model_dir=MODEL_DIR, model_format=MODEL_FORMAT, warm_start=True):
+    """
+    Fit every series in `series` with one ENGINES[engine_name].fit_many call, save the
+    models and materialize their forecasts. Runs inside a worker process; one result per country.
+    """
+    start = time.perf_counter()
+    forecaster = ENGINES[engine_name]
+    stems = {country: model_stem(country, model_dir, engine_name) for country in series}
+    history = {country: daily[['ds', 'y']] for country, daily in series.items()}
+    init = {}
+    if warm_start and engine_name == "prophet":
+        for country, stem in stems.items():
+            params = warm_start_params(stem)
+            if params is not None:
+                init[country] = params
+    try:
+        models = forecaster.fit_many(history, "D", init)
+    except Exception as e:
+        if not init:
+            raise
+        # e.g. the new data enables a seasonality the old model didn't have, so shapes differ
+        print(f"⚠️ Warm start failed for {', '.join(series)} ({e}), fitting from scratch")
+        init = {}
+        models = forecaster.fit_many(history, "D")
+    fit_seconds = (time.perf_counter() - start) / len(series)
+
+    # Each worker opens its own short-lived connection; pools don't survive fork
+    engine = create_engine(DATABASE_URL, poolclass=NullPool) if engine_name == "prophet" else None
+    results = []
+    for country, model in models.items():
+        stem = stems[country]
+        params = forecaster.to_params(model)
+        # Only Prophet objects pickle into something the API serves intervals from
+        country_format = model_format if engine_name == "prophet" else "params"
+        if params is None and country_format == "params":
+            print(f"⚠️ Model for {country} can't be stored as parameters, falling back to pickle")
+            country_format = "pickle"
+
+        model_version = None
+        if country_format in ("pickle", "both"):
+            save_pickle(model, f"{stem}.pkl")
+            model_version = file_digest(f"{stem}.pkl")
+        elif os.path.exists(f"{stem}.pkl"):
+            # A pickle from an earlier fit would otherwise keep serving interval requests
+            os.remove(f"{stem}.pkl")
+        if params is not None and country_format in ("params", "both"):
+            # Both artifacts of one fit share a version so precomputed rows match either
+            _, model_version = save_params(params, stem, model_version)
+        else:
+            # The API prefers <stem>.json, so an artifact from an earlier fit must not outlive it
+            remove_params(stem)
+
+        # The API only looks up precomputed forecasts for prophet models
+        n_rows = materialize_forecasts(engine, model, country, model_version) if engine is not None else 0
+        results.append({
+            "country": country,
+            "rows": len(series[country]),
+            "fit_seconds": fit_seconds,
+            "total_seconds": time.perf_counter() - start,
+            "model_version": model_version,
+            "forecast_rows": n_rows,
+            "warm_started": country in init,
+            "fingerprint": fingerprint(series[country]),
+        })
+    if engine is not None:
+        engine.dispose()
+    return results
+
+
+def train_all(engine_name, series, workers=None, model_dir=MODEL_DIR, model_format=MODEL_FORMAT, warm_start=True):
+    """
+    Fit every series in `series` across a process pool; returns (results, failures).
+    A batched engine fits all of them in one task, any other engine one task per country.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    if ENGINES[engine_name].batched:
+        groups = [series] if series else []
+    else:
+        groups = [{country: daily} for country, daily in series.items()]
+    results, failures = [], {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(train_group, engine_name, group, model_dir, model_format, warm_start): group
+            for group in groups
+        }
+        for future in as_completed(futures):
+            try:
+                group_results = future.result()
+            except Exception as e:
+                for country in futures[future]:
+                    failures[country] = str(e)
+                print(f"❌ Training failed for {', '.join(futures[future])}: {e}")
+                continue
+            for result in group_results:
+                results.append(result)
+                print(f"✅ {result['country']}: {'warm' if result['warm_started'] else 'cold'} {engine_name} fit "
+                      f"{result['fit_seconds']:.1f}s on {result['rows']} days, "
+                      f"model {result['model_version']}, {result['forecast_rows']} forecast rows")
+    return results, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train one forecasting model per country.")
+    parser.add_argument("--countries", nargs="*", help="Countries to train (default: every country in the data)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Parallel fits (default: CPU count)")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--engine", choices=list(ENGINES), default="prophet",
+                        help="prophet: one Stan fit per country; fourier: all countries in one batched NumPy solve")
+    parser.add_argument("--model-format", choices=["pickle", "params", "both"], default=MODEL_FORMAT,
+                        help="Artifacts to write for the prophet engine (fourier always writes params)")
+    parser.add_argument("--source-csv", help="Read line items from this CSV (chunked) instead of Postgres")
+    parser.add_argument("--force", action="store_true", help="Retrain countries whose data hasn't changed")
+    parser.add_argument("--cold", action="store_true", help="Don't warm-start from the previous models")
+    args = parser.parse_args()
+
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    start = time.perf_counter()
+    if args.source_csv:
+        series = split_by_country(aggregate_chunks(read_line_items_csv(args.source_csv)))
+    else:
+        engine = create_engine(DATABASE_URL)
+        series = load_daily_sales(engine)
+        engine.dispose()
+    print(f"📥 Loaded daily sales for {len(series)} countries in {time.perf_counter() - start:.1f}s")
+
+    if args.countries:
+        unknown = sorted(set(args.countries) - set(series))
+        if unknown:
+            print(f"⚠️ No data for: {', '.join(unknown)}")
+        series = {c: series[c] for c in args.countries if c in series}
+    skipped = sorted(c for c, daily in series.items() if len(daily) < MIN_TRAINING_DAYS)
+    if skipped:
+        print(f"⏭️ Skipping countries with fewer than {MIN_TRAINING_DAYS} days: {', '.join(skipped)}")
+    series = {c: daily for c, daily in series.items() if c not in skipped}
+
+    # Skip countries whose data is unchanged since the last run and whose model is still there.
+    # A batched engine refits every country in one solve, so it always retrains them all.
+    state = load_state(args.model_dir)
+    unchanged = sorted(
+        c for c, daily in series.items()
+        if not args.force and not ENGINES[args.engine].batched
+        and state.get(c, {}).get("fingerprint") == fingerprint(daily)
+        and any(os.path.exists(f"{model_stem(c, args.model_dir, args.engine)}{ext}") for ext in (".pkl", ".json"))
+    )
+    if unchanged:
+        print(f"⏭️ Unchanged since last run: {', '.join(unchanged)}")
+    series = {c: daily for c, daily in series.items() if c not in unchanged}
+
+    if args.engine == "prophet" and series:
+        engine = create_engine(DATABASE_URL, poolclass=NullPool)
+        create_forecast_table(engine)
+        engine.dispose()
+    results, failures = train_all(args.engine, series, args.workers, args.model_dir, args.model_format, not args.cold)
+    if not ENGINES[args.engine].batched:
+        for result in results:
+            state[result['country']] = {
+                "fingerprint": result['fingerprint'],
+                "model_version": result['model_version'],
+                "trained_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+        save_state(state, args.model_dir)
+
+    fit_total = sum(r['fit_seconds'] for r in results)
+    wall = time.perf_counter() - start
+    print(f"🏁 Trained {len(results)} models ({len(failures)} failed, {len(unchanged)} unchanged) in {wall:.1f}s wall, "
+          f"{fit_total:.1f}s of fitting across {args.workers} workers")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()